@@ -1,38 +1,60 @@
-from fastapi import APIRouter, status, HTTPException, Depends
-from ..models.models import User, Post, Reaction
-from ..db.session import get_session
-from sqlmodel import Session, select, text
-from .auth import get_current_user
-from ..models.enums import Role
+from fastapi import APIRouter, status, HTTPException, Depends, Query
+from ..models.models import Post, PostMetricRollup
+from ..db.session import get_async_session
+from ..db.queries import query_budget
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from .auth import get_current_user, get_async_read_session
+from ..schemas.user import TokenUser
+from ..models.enums import Role, ReactionType, MetricType, Granularity
+from ..schemas.analytics import MetricSeries
+from ..core.impressions import impression_buffer
+from ..core.counters import get_reaction_counts
+from ..core.leaderboard import leaderboard
+from ..core.config import settings
+from ..core.rollups import BUCKET_SIZE, truncate
+from ..core.hll import HyperLogLog
+from ..core.reach import reach_sketch
+from ..models.types import as_utc
+from datetime import datetime, timedelta, timezone
 
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
 
 
-@router.get("/{post_id}/metrics", status_code=status.HTTP_200_OK)
+@router.get("/{post_id}/metrics", status_code=status.HTTP_200_OK, dependencies=[Depends(query_budget(3))])
 async def get_post_analytics(
     post_id: int, 
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    current_user: TokenUser = Depends(get_current_user),
+    # on the primary like post detail, impressions and reach are added to the unflushed views
+    session: AsyncSession = Depends(get_async_session)
 ):
-    post = session.get(Post, post_id)
+    post = await session.get(Post, post_id)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
 
     if current_user.id != post.user_id and current_user.role != Role.ADMIN:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Unauthorized")
 
-    reactions = session.exec(select(Reaction).where(Reaction.post_id == post_id)).all()
+    counts = dict((await session.exec(get_reaction_counts(post_id))).all())
 
-    likes = sum(1 for r in reactions if r.type == "like")
-    support = sum(1 for r in reactions if r.type == "support")
-    celebrate = sum(1 for r in reactions if r.type == "celebrate")
-    insights = sum(1 for r in reactions if r.type == "insightful")
-    love = sum(1 for r in reactions if r.type == "love")
+    # distinct viewers, estimated from the stored sketch plus the views not flushed yet
+    stored = (await session.exec(reach_sketch(post_id))).one_or_none()
+    viewers = HyperLogLog.from_bytes(stored) if stored is not None else HyperLogLog()
+    pending = impression_buffer.pending_viewers(post_id)
+    if pending is not None:
+        viewers.merge(pending)
+
+    likes = counts.get(ReactionType.LIKE, 0)
+    support = counts.get(ReactionType.SUPPORT, 0)
+    celebrate = counts.get(ReactionType.CELEBRATE, 0)
+    insights = counts.get(ReactionType.INSIGHTFUL, 0)
+    love = counts.get(ReactionType.LOVE, 0)
 
     analytics = {
-        "total_reactions": len(reactions),
-        "impressions": post.impressions,
+        "total_reactions": sum(counts.values()),
+        "impressions": impression_buffer.impressions(post_id, post.impressions),
+        "unique_reach": viewers.count(),
         "engagements": likes + support + insights + celebrate + love,
         "reaction_types": {
             "likes": likes,
@@ -42,7 +64,7 @@ async def get_post_analytics(
             "love": love,
         },
 
-        "comments": 0,
+        "comments": post.comment_count,
         "shares": 5,
     }
 
@@ -50,35 +72,50 @@ async def get_post_analytics(
 
 
 
-@router.get("/posts/top", status_code=200)
+@router.get("/{post_id}/series",
+            response_model=MetricSeries,
+            status_code=status.HTTP_200_OK)
+async def get_post_series(
+    post_id: int,
+    metric: MetricType = MetricType.IMPRESSION,
+    granularity: Granularity = Granularity.DAY,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    current_user: TokenUser = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_read_session)
+):
+    post = await session.get(Post, post_id)
+    if not post:
+        raise HTTPException(status_code=404, detail="Post not found")
+
+    if current_user.id != post.user_id and current_user.role != Role.ADMIN:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Unauthorized")
+
+    # defaults to the last 7 days, missing buckets are reported as 0
+    end = truncate(as_utc(end or datetime.now(timezone.utc)), granularity)
+    start = truncate(as_utc(start) if start else end - timedelta(days=7), granularity)
+    step = BUCKET_SIZE[granularity]
+    points = (end - start) // step + 1
+    if points < 1 or points > settings.SERIES_MAX_POINTS:
+        raise HTTPException(status_code=422, detail=f"The range must cover 1 to {settings.SERIES_MAX_POINTS} buckets")
+
+    query = (
+        select(PostMetricRollup.bucket_start, PostMetricRollup.value)
+        .where(PostMetricRollup.post_id == post_id,
+               PostMetricRollup.metric == metric,
+               PostMetricRollup.granularity == granularity,
+               PostMetricRollup.bucket_start >= start,
+               PostMetricRollup.bucket_start <= end)
+    )
+    values = dict((await session.exec(query)).all())
+
+    series = [{"bucket": start + i * step, "value": values.get(start + i * step, 0)} for i in range(points)]
+    return {"post_id": post_id, "metric": metric, "granularity": granularity, "series": series}
+
+
+@router.get("/posts/top", status_code=200, dependencies=[Depends(query_budget(0))])
 async def get_top_posts(
-    limit: int = 3,
-    session: Session = Depends(get_session)
+    limit: int = Query(default=3, ge=1, le=settings.LEADERBOARD_SIZE)
 ):
-    query = text("""
-        SELECT 
-            p.id,
-            p.title,
-            p.impressions,
-            COUNT(r.id) AS total_reactions
-        FROM posts p
-        LEFT JOIN reactions r ON p.id = r.post_id
-        GROUP BY p.id
-        ORDER BY p.impressions DESC
-        LIMIT :limit
-    """).bindparams(limit=limit)
-
-    results = session.exec(query).all()
-
-    top_posts = []
-
-    for r in results:
-        post = {
-            "id": r.id,
-            "title": r.title,
-            "impressions": r.impressions,
-            "total_reactions": r.total_reactions
-        }
-        top_posts.append(post)
-
-    return {"top_posts": top_posts}
\ No newline at end of file
+    # served from memory, see Leaderboard for how stale it can be
+    return {"top_posts": leaderboard.top(limit)}
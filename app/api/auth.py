@@ -1,34 +1,85 @@
-from fastapi import APIRouter, status, HTTPException, Depends
-from ..schemas.user import UserCreate, UserPublic, Token
+from fastapi import APIRouter, status, HTTPException, Depends, Request
+from ..schemas.user import UserCreate, UserPublic, Token, TokenUser
 from ..models.models import User
-from ..db.session import get_session
+from ..db.session import get_session, get_async_session
+from ..db.replicas import replicas
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from .deps import (
-    get_password_hash,
+    get_password_hash_async,
     authenticate_user, 
     create_access_token,
     decode_jwt,
-    get_user_or_404
+    token_claims
 )
 from ..core.config import settings
+from ..core.security import revocations
+from pydantic import ValidationError
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login", auto_error=False)
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 SECRET_KEY = settings.SECRET_KEY
 ALGORITHM = settings.ALGORITHM
 
 
-def get_current_user(session: Session = Depends(get_session), token: str = Depends(oauth2_scheme)):
+# everything else changes data, and the user should see the change on the next read
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+async def get_current_user(request: Request, token: str = Depends(oauth2_scheme)) -> TokenUser:
+    # trusts the signed claims, the only per-request check is the in-process revocation table
     payload = decode_jwt(token, secret_key=SECRET_KEY, algorithms=[ALGORITHM])
-    username = payload.get("sub")
-    if not username:
+    try:
+        user = TokenUser(id=payload["uid"],
+                         username=payload["sub"],
+                         role=payload["role"],
+                         token_version=payload["ver"])
+    except (KeyError, ValidationError):
         raise HTTPException(status_code=401, detail="Invalid token")
-    
-    user = get_user_or_404(username=username, session=session)
-    if not user:
+
+    if revocations.is_revoked(user.id, user.token_version):
+        raise HTTPException(status_code=401, detail="Token revoked")
+
+    # deliberate side effect: authenticating a write is where we learn who is writing, so it
+    # pins that user's reads to the primary for a while (they read their own writes)
+    if request.method not in SAFE_METHODS:
+        replicas.pin(user.id)
+    return user
+
+
+async def get_optional_user(request: Request,
+                            token: str | None = Depends(optional_oauth2_scheme)) -> TokenUser | None:
+    # for public routes that do a bit more for logged in users, a bad token is just anonymous
+    if token is None:
+        return None
+    try:
+        return await get_current_user(request, token)
+    except HTTPException:
+        return None
+
+
+# read-only routes take these instead of get_session/get_async_session, they run on a replica
+# when there is one (see ReplicaSet). Nothing written through them is committed on purpose
+
+def get_read_session(viewer: TokenUser | None = Depends(get_optional_user)):
+    with replicas.read_session(viewer.id if viewer else None) as session:
+        yield session
+
+
+async def get_async_read_session(viewer: TokenUser | None = Depends(get_optional_user)):
+    async with replicas.async_read_session(viewer.id if viewer else None) as session:
+        yield session
+
+
+def get_current_db_user(current_user: TokenUser = Depends(get_current_user),
+                        session: Session = Depends(get_session)):
+    # for the few routes that need the whole row
+    user = session.get(User, current_user.id)
+    if user is None or user.token_version != current_user.token_version:
         raise HTTPException(status_code=401, detail="User not found")
     return user
 
@@ -36,36 +87,36 @@ def get_current_user(session: Session = Depends(get_session), token: str = Depen
 @router.post("/register",
              status_code=status.HTTP_201_CREATED,
              response_model=UserPublic)
-def register(new_user: UserCreate, session: Session = Depends(get_session)):
+async def register(new_user: UserCreate, session: AsyncSession = Depends(get_async_session)):
     query = select(User).where(User.username == new_user.username)
-    user = session.exec(query).one_or_none()
+    user = (await session.exec(query)).one_or_none()
 
     if user is not None:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="User already exists")
     else:
         user = User(**new_user.model_dump())
-        user.password = get_password_hash(new_user.password)
+        user.password = await get_password_hash_async(new_user.password)
         session.add(user)
-        session.commit()
-        session.refresh(user)
+        await session.commit()
+        await session.refresh(user)
         return user
 
 
 @router.post("/login",
              response_model=Token,
              status_code=status.HTTP_200_OK)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), session: Session = Depends(get_session)):
-    user = authenticate_user(form_data.username, form_data.password, session)
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), session: AsyncSession = Depends(get_async_session)):
+    user = await authenticate_user(form_data.username, form_data.password, session)
 
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect username or password")
 
-    access_token = create_access_token(user_data={"sub": user.username})
+    access_token = create_access_token(user_data=token_claims(user))
     return Token(access_token=access_token, token_type="bearer")
 
 
 # This route is responsible for displaying the Authorize button
 @router.get("/users/me",
             response_model=UserPublic)
-async def read_users_me(current_user: User = Depends(get_current_user)):
+async def read_users_me(current_user: User = Depends(get_current_db_user)):
     return current_user
\ No newline at end of file
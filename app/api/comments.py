@@ -0,0 +1,91 @@
+from fastapi import APIRouter, status, HTTPException, Depends, Query
+from ..schemas.comment import CommentCreate, CommentPublic, CommentPage
+from ..models.models import Comment
+from ..db.session import get_async_session
+from ..db.queries import query_budget
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.exc import IntegrityError
+from .auth import get_current_user, get_async_read_session
+from ..schemas.user import TokenUser
+from ..models.enums import Role
+from ..db.errors import is_foreign_key_violation
+from ..core.comments import comment_count_delta, reply_count_delta, delete_thread
+from ..core.pagination import keyset, page
+from ..core.serialization import OrjsonResponse, public_columns, as_dicts
+from ..core.config import settings
+from datetime import datetime
+
+router = APIRouter(tags=["comments"])
+
+COMMENT_COLUMNS = public_columns(Comment, CommentPublic)
+# threads read oldest first
+COMMENT_SORT_KEY = (Comment.created_at, Comment.id)
+COMMENT_CURSOR_TYPES = (datetime.fromisoformat, int)
+
+
+@router.get("/posts/{post_id}/comments",
+            response_model=CommentPage,
+            status_code=status.HTTP_200_OK,
+            dependencies=[Depends(query_budget(1))])
+async def get_comments(post_id: int,
+                       parent_id: int | None = None,
+                       cursor: str | None = None,
+                       limit: int = Query(default=settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+                       session: AsyncSession = Depends(get_async_read_session)):
+    # one level of the thread: the top level comments, or the replies to parent_id.
+    # reply_count tells the client which ones have replies to load
+    query = select(*COMMENT_COLUMNS).where(Comment.post_id == post_id, Comment.parent_id == parent_id)
+    query = keyset(query, COMMENT_SORT_KEY, COMMENT_CURSOR_TYPES, cursor, limit, descending=False)
+    comments, next_cursor = page((await session.exec(query)).all(), limit, lambda c: (c.created_at, c.id))
+    return OrjsonResponse({"items": as_dicts(comments), "next_cursor": next_cursor})
+
+
+@router.post("/posts/{post_id}/comments",
+             response_model=CommentPublic,
+             status_code=status.HTTP_201_CREATED)
+async def create_comment(post_id: int,
+                         comment: CommentCreate,
+                         current_user: TokenUser = Depends(get_current_user),
+                         session: AsyncSession = Depends(get_async_session)):
+    if comment.parent_id is not None:
+        parent = await session.get(Comment, comment.parent_id)
+        if parent is None or parent.post_id != post_id:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Comment not found")
+
+    new_comment = Comment(post_id=post_id, user_id=current_user.id, **comment.model_dump())
+    session.add(new_comment)
+    try:
+        await session.flush()
+        await session.exec(comment_count_delta(post_id, 1))
+        if comment.parent_id is not None:
+            await session.exec(reply_count_delta(comment.parent_id, 1))
+        await session.commit()
+    except IntegrityError as e:
+        await session.rollback()
+        if is_foreign_key_violation(e):
+            # no such post, or the parent was deleted meanwhile
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post not found")
+        raise
+
+    return new_comment
+
+
+@router.delete("/comments/{id}",
+               status_code=status.HTTP_204_NO_CONTENT)
+async def delete_comment(id: int,
+                         current_user: TokenUser = Depends(get_current_user),
+                         session: AsyncSession = Depends(get_async_session)):
+    comment = await session.get(Comment, id)
+    if comment is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Comment not found")
+
+    if comment.user_id != current_user.id and current_user.role != Role.ADMIN:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Unauthorized access. You don't have to permission to delete this comment")
+
+    # the replies go with it
+    deleted = len((await session.exec(delete_thread(id))).all())
+    await session.exec(comment_count_delta(comment.post_id, -deleted))
+    if comment.parent_id is not None:
+        await session.exec(reply_count_delta(comment.parent_id, -1))
+    await session.commit()
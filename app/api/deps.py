@@ -1,6 +1,7 @@
 from fastapi import status, HTTPException, Depends
 from ..db.session import get_session
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from ..models.models import User
 from ..schemas.user import UserPublic
 from passlib.context import CryptContext
@@ -8,21 +9,27 @@ import jwt
 from jwt.exceptions import InvalidTokenError, ExpiredSignatureError
 # from .auth import oauth2_scheme
 from ..core.config import settings
+from ..core.security import password_pool
 from datetime import datetime, timedelta, timezone
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# hashes made with a different cost are upgraded on the next login, see authenticate_user
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
 SECRET_KEY = settings.SECRET_KEY
 ALGORITHM = settings.ALGORITHM
 EXPIRATION_MINUTES = settings.TOKEN_EXPIRATION_MINUTES
 
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return password_pool.run(pwd_context.hash, password)
+
+
+async def get_password_hash_async(password):
+    return await password_pool.run_async(pwd_context.hash, password)
 
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_pool.run(pwd_context.verify, plain_password, hashed_password)
 
 
 def decode_jwt(token: str, secret_key: str, algorithms: list[str]):
@@ -44,21 +51,39 @@ def get_user_or_404(username: str, session: Session):
     return user
 
 
-def authenticate_user(username: str, password: str, session: Session):
+async def authenticate_user(username: str, password: str, session: AsyncSession):
     user = None
     
     query = select(User).where(User.username == username)
-    user = session.exec(query).one_or_none()
+    user = (await session.exec(query)).one_or_none()
 
     if user is None:
         return False
-    if not verify_password(password, user.password):
+
+    valid, new_hash = await password_pool.run_async(pwd_context.verify_and_update, password, user.password)
+    if not valid:
         return False
+
+    # BCRYPT_ROUNDS changed since this hash was made, store it again with the current cost
+    if new_hash is not None:
+        user.password = new_hash
+        session.add(user)
+        await session.commit()
     return user
 
 
+def token_claims(user: User) -> dict:
+    # enough for get_current_user to authorize a request without loading the user
+    return {
+        "sub": user.username,
+        "uid": user.id,
+        "role": user.role.value,
+        "ver": user.token_version,
+    }
+
+
 def create_access_token(user_data: dict):
-    # user_data dictionary contains the username
+    # user_data dictionary contains the claims from token_claims
     to_encode = user_data.copy()
 
     expire = datetime.now(timezone.utc) + timedelta(minutes=EXPIRATION_MINUTES)
@@ -0,0 +1,27 @@
+from fastapi import APIRouter, status, Depends, Query
+from ..schemas.post import PostPublic, FeedPage
+from ..models.models import Post
+from ..db.queries import query_budget
+from sqlmodel.ext.asyncio.session import AsyncSession
+from .auth import get_current_user, get_async_read_session
+from ..schemas.user import TokenUser
+from ..core.config import settings
+from ..core.feed import read_feed
+from ..core.serialization import OrjsonResponse, public_columns, as_dicts
+
+router = APIRouter(prefix="/feed", tags=["feed"])
+
+FEED_COLUMNS = (*public_columns(Post, PostPublic), Post.published_at)
+
+
+@router.get("/",
+            response_model=FeedPage,
+            status_code=status.HTTP_200_OK,
+            dependencies=[Depends(query_budget(2))])
+async def get_feed(cursor: str | None = None,
+                   limit: int = Query(default=settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+                   current_user: TokenUser = Depends(get_current_user),
+                   session: AsyncSession = Depends(get_async_read_session)):
+    # posts of the people you follow, newest first
+    posts, next_cursor = await read_feed(session, current_user.id, FEED_COLUMNS, cursor, limit)
+    return OrjsonResponse({"items": as_dicts(posts), "next_cursor": next_cursor})
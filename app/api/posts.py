@@ -1,26 +1,64 @@
-from fastapi import APIRouter, status, HTTPException, Depends
-from ..schemas.post import PostCreate, PostPublic, PostUpdate
-from ..schemas.reaction import ReactionPublic
-from ..models.models import User, Post, Reaction
-from ..db.session import get_session
+from fastapi import APIRouter, status, HTTPException, Depends, Query, Request
+from ..schemas.post import PostCreate, PostPublic, PostUpdate, PostPage
+from ..schemas.reaction import ReactionPublic, BulkReactionReport
+from ..models.models import Post, Reaction
+from ..db.session import get_session, get_async_session
+from ..db.queries import query_budget
 from sqlmodel import Session, select
-from .auth import get_current_user
-from ..models.enums import Role, Status, ReactionType
+from sqlmodel.ext.asyncio.session import AsyncSession
+from .auth import get_current_user, get_optional_user, get_async_read_session
+from ..schemas.user import TokenUser
+from ..models.enums import Role, Status, ReactionType, ExportFormat
+from ..core.impressions import impression_buffer
+from ..core.counters import reaction_count_delta, save_reaction, REACTION_ATTEMPTS
+from ..core.bulk_reactions import import_reactions, iter_json_array, iter_ndjson
+from ..db.errors import is_foreign_key_violation
+from sqlalchemy.exc import IntegrityError
+from ..core.leaderboard import leaderboard
+from ..core.pagination import keyset, page
+from ..core.serialization import OrjsonResponse, public_columns, as_dicts
+from ..core.export import export_response
+from ..core.search import search_index
+from ..core.feed import fan_out
+from ..core.config import settings
+from ..core.schedule_queue import schedule_queue, notify_scheduled
 from datetime import datetime, timezone, timedelta
 
 router = APIRouter(prefix="/posts", tags=["posts"])
 
+POST_SORT_KEY = (Post.created_at, Post.id)
+# list routes select these instead of whole ORM objects and encode the rows as they are
+POST_COLUMNS = public_columns(Post, PostPublic)
+REACTION_COLUMNS = public_columns(Reaction, ReactionPublic)
+POST_CURSOR_TYPES = (datetime.fromisoformat, int)
+
+
+def post_cursor_key(post: Post):
+    return post.created_at, post.id
+
+
+def viewer_key(request: Request, viewer: TokenUser | None) -> str:
+    # who counts as one viewer for the unique reach; anonymous viewers by address and browser
+    if viewer is not None:
+        return f"user:{viewer.id}"
+    host = request.client.host if request.client else ""
+    return f"anon:{host}:{request.headers.get('user-agent', '')}"
+
+
 @router.get("/",
-            response_model=list[PostPublic],
-            status_code=status.HTTP_200_OK)
+            response_model=PostPage,
+            status_code=status.HTTP_200_OK,
+            dependencies=[Depends(query_budget(1))])
 async def get_posts(
     user_id: int | None = None,
     status: Status | None = None,
     start_date: datetime | None = None,
     end_date: datetime | None = None,
-    session: Session = Depends(get_session)
+    cursor: str | None = None,
+    limit: int = Query(default=settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+    session: AsyncSession = Depends(get_async_read_session)
 ):
-    query = select(Post)
+    query = select(*POST_COLUMNS)
 
     if user_id is not None:
         query = query.where(Post.user_id == user_id)
@@ -34,27 +72,81 @@ async def get_posts(
     if status is not None:
         query = query.where(Post.status == status)    
 
-    posts = session.exec(query).all()
-    return posts
+    query = keyset(query, POST_SORT_KEY, POST_CURSOR_TYPES, cursor, limit)
+    posts, next_cursor = page((await session.exec(query)).all(), limit, post_cursor_key)
+    return OrjsonResponse({"items": as_dicts(posts), "next_cursor": next_cursor})
 
 
 @router.get("/my-posts",
-            response_model=list[PostPublic],
+            response_model=PostPage,
+            status_code=status.HTTP_200_OK,
+            dependencies=[Depends(query_budget(1))])
+async def get_my_posts(cursor: str | None = None,
+                       limit: int = Query(default=settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+                       current_user: TokenUser = Depends(get_current_user),
+                       session: AsyncSession = Depends(get_async_read_session)):
+    query = keyset(select(*POST_COLUMNS).where(Post.user_id == current_user.id),
+                   POST_SORT_KEY, POST_CURSOR_TYPES, cursor, limit)
+    my_posts, next_cursor = page((await session.exec(query)).fetchall(), limit, post_cursor_key)
+
+    return OrjsonResponse({"items": as_dicts(my_posts), "next_cursor": next_cursor})
+
+
+@router.get("/search",
+            response_model=PostPage,
+            status_code=status.HTTP_200_OK,
+            dependencies=[Depends(query_budget(1))])
+async def search_posts(q: str = Query(min_length=1, max_length=200),
+                       cursor: str | None = None,
+                       limit: int = Query(default=settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+                       session: AsyncSession = Depends(get_async_read_session)):
+    # published posts matching q in the title or body, best match first
+    posts, next_cursor = await search_index.search(session, q, POST_COLUMNS, cursor, limit)
+    items = as_dicts(posts)
+    for item in items:
+        item.pop("rank", None)
+    return OrjsonResponse({"items": items, "next_cursor": next_cursor})
+
+
+@router.get("/my-posts/export",
             status_code=status.HTTP_200_OK)
-async def get_my_posts(current_user: User = Depends(get_current_user),
-                       session: Session = Depends(get_session)):
-    my_posts = session.exec(
-    select(Post).where(Post.user_id == current_user.id)
-    ).fetchall()
+async def export_my_posts(format: ExportFormat = ExportFormat.NDJSON,
+                          current_user: TokenUser = Depends(get_current_user)):
+    query = select(*POST_COLUMNS).where(Post.user_id == current_user.id).order_by(Post.created_at, Post.id)
+    return export_response(query, format, "posts")
+
+
+@router.post("/reactions/bulk",
+             response_model=BulkReactionReport,
+             status_code=status.HTTP_200_OK,
+             # one insert per chunk, as many chunks as the upload has
+             dependencies=[Depends(query_budget(None, max_repeats=None))])
+async def bulk_create_reactions(
+    request: Request,
+    current_user: TokenUser = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    # for import/replay tools: a JSON array or NDJSON (application/x-ndjson) of
+    # {"post_id", "user_id", "type", "created_at"?}, existing reactions are kept as they are
+    if current_user.role != Role.ADMIN:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Unauthorized")
 
-    return my_posts
+    if "ndjson" in request.headers.get("content-type", ""):
+        items = iter_ndjson(request.stream())
+    else:
+        items = iter_json_array(request.stream())
+    return await import_reactions(session, items, settings.BULK_REACTION_CHUNK_SIZE)
 
 
 @router.get("/{id}",
             response_model=PostPublic,
-            status_code=status.HTTP_200_OK)
+            status_code=status.HTTP_200_OK,
+            dependencies=[Depends(query_budget(1))])
 def get_posts(
     id: int, 
+    request: Request,
+    viewer: TokenUser | None = Depends(get_optional_user),
+    # on the primary, the impressions it returns must not go backwards after a flush
     session: Session = Depends(get_session)
 ):
     query = select(Post).where(Post.id == id)
@@ -62,12 +154,10 @@ def get_posts(
     if post_found is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Post not found')
     
-    # simulating a view. Each time this post is requested, increase the impression/view
-    post_found.impressions += 1
-    session.add(post_found)
-    session.commit()
-    session.refresh(post_found)
-    return post_found
+    # simulating a view. Views are buffered and written back in batches,
+    # the response includes the ones that haven't been flushed yet
+    impressions = impression_buffer.record(id, post_found.impressions, viewer_key(request, viewer))
+    return PostPublic.model_validate(post_found.model_dump() | {"impressions": impressions})
 
 
 @router.post("/", 
@@ -75,8 +165,8 @@ def get_posts(
              status_code=status.HTTP_201_CREATED)
 async def create_posts(
     post: PostCreate,
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    current_user: TokenUser = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session)
 ):
     now = datetime.now(timezone.utc)
 
@@ -92,10 +182,17 @@ async def create_posts(
         new_post.status = Status.SCHEDULED
     else:
         new_post.status = Status.PUBLISHED
+        new_post.published_at = now
 
     session.add(new_post)
-    session.commit()
-    session.refresh(new_post)
+    await session.flush()
+    if new_post.status == Status.SCHEDULED:
+        await notify_scheduled(session, new_post.id, new_post.scheduled_at)
+    else:
+        await session.exec(fan_out([new_post.id]))
+    await session.commit()
+    await session.refresh(new_post)
+    search_index.index(new_post)
 
     return new_post
 
@@ -104,10 +201,10 @@ async def create_posts(
 @router.put("/{id}", response_model=PostPublic, status_code=status.HTTP_200_OK)
 async def update_posts(id: int,
                         post: PostUpdate,
-                        current_user: User = Depends(get_current_user),
-                        session: Session = Depends(get_session)):
+                        current_user: TokenUser = Depends(get_current_user),
+                        session: AsyncSession = Depends(get_async_session)):
     query = select(Post).where(Post.id == id)
-    post_found = session.exec(query).one_or_none()
+    post_found = (await session.exec(query)).one_or_none()
 
     if post_found is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post not found")
@@ -120,8 +217,11 @@ async def update_posts(id: int,
     if post.scheduled_at: post_found.scheduled_at = post.scheduled_at
 
     session.add(post_found)
-    session.commit()
-    session.refresh(post_found)
+    if post.scheduled_at and post_found.status == Status.SCHEDULED:
+        await notify_scheduled(session, post_found.id, post_found.scheduled_at)
+    await session.commit()
+    await session.refresh(post_found)
+    search_index.index(post_found)
     return post_found
 
 
@@ -129,19 +229,22 @@ async def update_posts(id: int,
                 status_code=status.HTTP_204_NO_CONTENT)
 async def delete_posts(
     id: int,
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    current_user: TokenUser = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session)
 ):
     query = select(Post).where(Post.id == id)
-    post_found = session.exec(query).one_or_none()
+    post_found = (await session.exec(query)).one_or_none()
 
     if post_found is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post not found")
 
     if post_found.user_id != current_user.id and current_user.role != Role.ADMIN:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Unauthorized access. You don't have to permission to modify/delete this post")
-    session.delete(post_found)
-    session.commit()
+    await session.delete(post_found)
+    await session.commit()
+    schedule_queue.discard(id)
+    leaderboard.remove(id)
+    search_index.remove(id)
 
 
 @router.get(
@@ -151,61 +254,81 @@ async def delete_posts(
 )
 async def get_reactions(
     id: int,
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    current_user: TokenUser = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_read_session)
 ):
-    query = select(Reaction).where(Reaction.post_id == id)
-    reactions = session.exec(query).fetchall()
+    query = select(*REACTION_COLUMNS).where(Reaction.post_id == id)
+    reactions = (await session.exec(query)).fetchall()
 
-    return reactions
+    return OrjsonResponse(as_dicts(reactions), status_code=status.HTTP_201_CREATED)
+
+
+@router.get(
+    "/{id}/reactions/export",
+    status_code=status.HTTP_200_OK
+)
+async def export_reactions(
+    id: int,
+    format: ExportFormat = ExportFormat.NDJSON,
+    current_user: TokenUser = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    post = await session.get(Post, id)
+    if post is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post not found")
+
+    if post.user_id != current_user.id and current_user.role != Role.ADMIN:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Unauthorized")
+
+    query = select(*REACTION_COLUMNS).where(Reaction.post_id == id).order_by(Reaction.id)
+    return export_response(query, format, f"post-{id}-reactions")
 
 
 @router.post(
     "/{id}/reactions", 
     status_code=status.HTTP_201_CREATED,
-    response_model=ReactionPublic
+    response_model=ReactionPublic,
+    # one statement, again after losing a race with the same user's other request
+    dependencies=[Depends(query_budget(REACTION_ATTEMPTS))]
 )
 async def create_reactions(
     id: int, 
     reaction: ReactionType,
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    current_user: TokenUser = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session)
 ):
-    query = select(Post).where(Post.id == id)
-    post_found = session.exec(query).one_or_none()
-
-    if post_found is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post not found")
-
-    query = select(Reaction).where(Reaction.post_id == id, Reaction.user_id == current_user.id)
-    reaction_found = session.exec(query).one_or_none()
-
-    if reaction_found is not None:
-        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="You have already reacted to this post")
-
-    new_reaction = Reaction(post_id=id, user_id=current_user.id, type=reaction)
-    print(new_reaction)
-    session.add(new_reaction)
-    session.commit()
-    session.refresh(new_reaction)
+    # reacting again with another type changes the reaction
+    try:
+        new_reaction = await save_reaction(session, id, current_user.id, reaction)
+    except IntegrityError as e:
+        await session.rollback()
+        if is_foreign_key_violation(e):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post not found")
+        raise
+
+    if new_reaction.inserted:
+        leaderboard.add_reactions(id, 1)
     return new_reaction
 
 
 @router.delete(
     "/{id}/reactions", 
-    status_code=status.HTTP_204_NO_CONTENT
+    status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=[Depends(query_budget(3))]
 )
 async def delete_reactions(
     id: int, 
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    current_user: TokenUser = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session)
 ):
     query = select(Reaction).where(Reaction.post_id == id, Reaction.user_id == current_user.id)
-    reaction = session.exec(query).one_or_none()
+    reaction = (await session.exec(query)).one_or_none()
 
     if reaction is None:
         raise HTTPException(status_code=404, detail="Reaction not found")
 
-    session.delete(reaction)
-    session.commit()
+    await session.delete(reaction)
+    await session.exec(reaction_count_delta(id, reaction.type, -1))
+    await session.commit()
+    leaderboard.add_reactions(id, -1)
     return  
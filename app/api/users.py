@@ -1,29 +1,39 @@
 from fastapi import APIRouter, status, HTTPException, Depends
+from sqlalchemy import delete, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from ..schemas.user import UserPublic, UserUpdate
-from ..models.models import User
+from ..models.models import User, TokenRevocation, Follow, Reaction
 from ..db.session import get_session
 from sqlmodel import Session, select
 from .deps import get_password_hash
-from .auth import get_current_user
+from .auth import get_current_user, get_read_session
+from ..schemas.user import TokenUser
+from ..core.counters import remove_user_reaction_counts
+from ..core.security import revocations, USER_DELETED
+from ..core.serialization import OrjsonResponse, public_columns, as_dicts
+from ..core.feed import backfill, remove_from_feed, remove_user_follows
+from ..core.comments import remove_user_comment_counts
 
 router = APIRouter(prefix="/users", tags=["users"])
 
+USER_COLUMNS = public_columns(User, UserPublic)
+
 
 @router.get("/", 
             status_code=status.HTTP_200_OK, 
             response_model=list[UserPublic])
-def get_user(session: Session = Depends(get_session)):
-    query = select(User)
+def get_user(session: Session = Depends(get_read_session)):
+    query = select(*USER_COLUMNS)
     user = session.exec(query).fetchall()
 
-    return user
+    return OrjsonResponse(as_dicts(user))
 
 
 @router.get("/{id}", 
             status_code=status.HTTP_200_OK, 
             response_model=UserPublic)
 def get_user_by_id(id: int, 
-                   session: Session = Depends(get_session)):
+                   session: Session = Depends(get_read_session)):
     query = select(User).where(User.id == id)
     user = session.exec(query).one_or_none()
 
@@ -38,7 +48,7 @@ def get_user_by_id(id: int,
             status_code=status.HTTP_200_OK)
 def update_user(user: UserUpdate, 
                 session: Session = Depends(get_session),
-                current_user: User = Depends(get_current_user)):
+                current_user: TokenUser = Depends(get_current_user)):
     query = select(User).where(User.id == current_user.id)
     user_found = session.exec(query).one_or_none()
 
@@ -48,18 +58,24 @@ def update_user(user: UserUpdate,
     if user.username: user_found.username = user.username
     if user.firstname: user_found.firstname = user.firstname
     if user.lastname: user_found.lastname = user.lastname
-    if user.password: user_found.password = get_password_hash(user.password)
+    if user.password:
+        user_found.password = get_password_hash(user.password)
+        # a new password logs out every token issued with the old one
+        user_found.token_version += 1
+        session.add(TokenRevocation(user_id=user_found.id, token_version=user_found.token_version))
 
     session.add(user_found)
     session.commit()
     session.refresh(user_found)
+    if user.password:
+        revocations.apply(user_found.id, user_found.token_version)
     return user_found
 
 
 @router.delete("/",
                status_code=status.HTTP_204_NO_CONTENT)
 def delete_user(session: Session = Depends(get_session),
-                current_user: User = Depends(get_current_user)):
+                current_user: TokenUser = Depends(get_current_user)):
     query = select(User).where(User.id == current_user.id)
 
     user_found = session.exec(query).one_or_none()
@@ -67,5 +83,50 @@ def delete_user(session: Session = Depends(get_session),
     if user_found is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     else:
+        session.exec(remove_user_reaction_counts(user_found.id))
+        # deleted here, not left to ON DELETE CASCADE: session.delete() below would load
+        # user.reactions and set their user_id to NULL, keeping rows the counters dropped
+        session.exec(delete(Reaction).where(Reaction.user_id == user_found.id))
+        session.exec(remove_user_follows(user_found.id))
+        for query in remove_user_comment_counts(user_found.id):
+            session.exec(query)
+        session.add(TokenRevocation(user_id=user_found.id, token_version=USER_DELETED))
         session.delete(user_found)
-        session.commit()
\ No newline at end of file
+        session.commit()
+        revocations.apply(current_user.id, USER_DELETED)
+
+
+@router.post("/{id}/follow",
+             status_code=status.HTTP_201_CREATED)
+def follow_user(id: int,
+                session: Session = Depends(get_session),
+                current_user: TokenUser = Depends(get_current_user)):
+    if id == current_user.id:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="You can't follow yourself")
+
+    if session.get(User, id) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+
+    query = pg_insert(Follow).values(follower_id=current_user.id, followee_id=id).on_conflict_do_nothing()
+    if session.exec(query).rowcount == 0:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="You already follow this user")
+
+    session.exec(update(User).where(User.id == id).values(follower_count=User.follower_count + 1))
+    session.exec(backfill(current_user.id, id))
+    session.commit()
+    return {"following": id}
+
+
+@router.delete("/{id}/follow",
+               status_code=status.HTTP_204_NO_CONTENT)
+def unfollow_user(id: int,
+                  session: Session = Depends(get_session),
+                  current_user: TokenUser = Depends(get_current_user)):
+    follow = session.get(Follow, (current_user.id, id))
+    if follow is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="You don't follow this user")
+
+    session.delete(follow)
+    session.exec(update(User).where(User.id == id).values(follower_count=User.follower_count - 1))
+    session.exec(remove_from_feed(current_user.id, id))
+    session.commit()
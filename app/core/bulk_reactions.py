@@ -0,0 +1,223 @@
+import codecs
+import json
+from collections import defaultdict
+from datetime import datetime, timezone
+from fastapi import HTTPException, status
+from sqlalchemy import Boolean, Integer, text
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from ..models.models import RollupWatermark
+from ..models.enums import MetricType, ReactionType
+from ..models.types import UtcDateTime, as_utc
+from .leaderboard import leaderboard
+from .rollups import REACTIONS_WATERMARK, add_to_buckets, rollup_upserts
+
+# a single item bigger than this can't be a reaction, stop buffering
+MAX_ITEM_BYTES = 64 * 1024
+# how many parse errors are echoed back, the rest are only counted
+MAX_ERRORS = 20
+
+
+# Bulk import of historical reactions. The body is read as a stream and written
+# in chunks, each chunk is a single statement and its own transaction, so memory
+# stays flat and a retried import skips what already went in.
+
+BULK_INSERT_REACTIONS = text("""
+    WITH batch AS (
+        SELECT * FROM unnest(
+            CAST(:post_ids AS integer[]), CAST(:user_ids AS integer[]),
+            CAST(:types AS reactiontype[]), CAST(:created_ats AS timestamp[])
+        ) AS b(post_id, user_id, type, created_at)
+    ), known AS (
+        SELECT * FROM batch
+        WHERE EXISTS (SELECT 1 FROM posts WHERE posts.id = batch.post_id)
+          AND EXISTS (SELECT 1 FROM users WHERE users.id = batch.user_id)
+    ), inserted AS (
+        INSERT INTO reactions (post_id, user_id, type, created_at)
+        SELECT post_id, user_id, type, created_at FROM known
+        ON CONFLICT (post_id, user_id) DO NOTHING
+        RETURNING post_id, type, created_at
+    ), counted AS (
+        INSERT INTO post_reaction_counts (post_id, type, count)
+        SELECT post_id, type, count(*) FROM inserted GROUP BY post_id, type
+        ON CONFLICT (post_id, type) DO UPDATE SET count = post_reaction_counts.count + EXCLUDED.count
+    ), grouped AS (
+        SELECT post_id, date_trunc('hour', created_at) AS hour,
+               COALESCE(created_at <= CAST(:watermark AS timestamp), false) AS rolled_up,
+               count(*) AS reactions
+        FROM inserted
+        GROUP BY 1, 2, 3
+    )
+    SELECT (SELECT count(*) FROM known) AS known, grouped.*
+    FROM (SELECT 1) one LEFT JOIN grouped ON true
+""").columns(known=Integer, post_id=Integer, hour=UtcDateTime, rolled_up=Boolean, reactions=Integer)
+
+
+def parse_reaction(item) -> tuple:
+    # {"post_id", "user_id", "type", "created_at"?} or [post_id, user_id, type, created_at?]
+    if isinstance(item, dict):
+        values = (item.get("post_id"), item.get("user_id"), item.get("type"), item.get("created_at"))
+    elif isinstance(item, list) and len(item) in (3, 4):
+        values = (*item, None) if len(item) == 3 else tuple(item)
+    else:
+        raise ValueError("expected an object or a [post_id, user_id, type] array")
+
+    post_id, user_id, type, created_at = values
+    for name, value in (("post_id", post_id), ("user_id", user_id)):
+        if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+            raise ValueError(f"{name} must be a positive integer")
+    try:
+        type = ReactionType(type)
+    except ValueError:
+        raise ValueError(f"unknown reaction type {type!r}")
+    try:
+        created_at = as_utc(datetime.fromisoformat(created_at)) if created_at is not None else None
+    except (TypeError, ValueError):
+        raise ValueError("created_at must be an ISO 8601 timestamp")
+    return post_id, user_id, type, created_at
+
+
+async def iter_ndjson(chunks):
+    # yields (item number, parsed value or the ValueError), a bad line doesn't stop the import
+    buffer = b""
+    number = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        if len(buffer) > MAX_ITEM_BYTES:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail=f"NDJSON line longer than {MAX_ITEM_BYTES} bytes")
+        for line in lines:
+            if line.strip():
+                number += 1
+                yield number, decode_line(line)
+    if buffer.strip():
+        yield number + 1, decode_line(buffer)
+
+
+def decode_line(line: bytes):
+    try:
+        return json.loads(line)
+    except ValueError:
+        return ValueError("invalid JSON")
+
+
+async def with_end(chunks):
+    async for chunk in chunks:
+        yield chunk
+    yield None
+
+
+def malformed(number: int) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Malformed JSON array after item {number}")
+
+
+async def iter_json_array(chunks):
+    # incremental parse of a top level array, one item in memory at a time
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer, state, number = "", "start", 0
+
+    async for chunk in with_end(chunks):
+        final = chunk is None
+        buffer += utf8.decode(chunk or b"", final=final)
+        while True:
+            buffer = buffer.lstrip()
+            if not buffer:
+                break
+            if state == "start":
+                if buffer[0] != "[":
+                    raise malformed(number)
+                buffer, state = buffer[1:], "first"
+            elif state == "next":
+                if buffer[0] == "]":
+                    return
+                if buffer[0] != ",":
+                    raise malformed(number)
+                buffer, state = buffer[1:], "item"
+            elif state == "first" and buffer[0] == "]":
+                return
+            else:
+                try:
+                    item, end = decoder.raw_decode(buffer)
+                except ValueError:
+                    # most likely cut off by the chunk boundary
+                    if final or len(buffer) > MAX_ITEM_BYTES:
+                        raise malformed(number)
+                    break
+                # a number right at the end may still go on in the next chunk
+                if end == len(buffer) and not final:
+                    break
+                number += 1
+                buffer, state = buffer[end:], "next"
+                yield number, item
+    raise malformed(number)
+
+
+async def write_chunk(session: AsyncSession, rows: list[tuple], now: datetime) -> tuple[int, int]:
+    # returns (accepted, known); rows for a missing post or user aren't known
+    # reactions older than the rollup watermark won't be picked up by the rollup job,
+    # so they're added to the buckets here. FOR SHARE keeps the job from moving it meanwhile
+    watermark = (await session.exec(
+        select(RollupWatermark.value).where(RollupWatermark.name == REACTIONS_WATERMARK).with_for_update(read=True)
+    )).one_or_none()
+
+    query = BULK_INSERT_REACTIONS.bindparams(
+        post_ids=[row[0] for row in rows],
+        user_ids=[row[1] for row in rows],
+        types=[row[2].name for row in rows],
+        created_ats=[(row[3] or now).replace(tzinfo=None) for row in rows],
+        watermark=watermark.replace(tzinfo=None) if watermark else None,
+    )
+    result = (await session.exec(query)).all()
+
+    counts = defaultdict(int)
+    per_post = defaultdict(int)
+    for row in result:
+        if row.post_id is None:
+            continue
+        per_post[row.post_id] += row.reactions
+        if row.rolled_up:
+            add_to_buckets(counts, row.post_id, MetricType.ENGAGEMENT, row.hour, row.reactions)
+    for upsert in rollup_upserts(counts):
+        await session.exec(upsert)
+    await session.commit()
+
+    for post_id, added in per_post.items():
+        leaderboard.add_reactions(post_id, added)
+    return sum(per_post.values()), result[0].known
+
+
+async def import_reactions(session: AsyncSession, items, chunk_size: int) -> dict:
+    report = {"accepted": 0, "duplicate": 0, "rejected": 0, "batches": [], "errors": []}
+    rows, invalid = [], 0
+
+    async def flush():
+        nonlocal rows, invalid
+        accepted, known = await write_chunk(session, rows, datetime.now(timezone.utc)) if rows else (0, 0)
+        batch = {
+            "batch": len(report["batches"]) + 1,
+            "accepted": accepted,
+            "duplicate": known - accepted,
+            "rejected": invalid + len(rows) - known,
+        }
+        report["batches"].append(batch)
+        for key in ("accepted", "duplicate", "rejected"):
+            report[key] += batch[key]
+        rows, invalid = [], 0
+
+    async for number, item in items:
+        try:
+            if isinstance(item, ValueError):
+                raise item
+            rows.append(parse_reaction(item))
+        except ValueError as e:
+            invalid += 1
+            if len(report["errors"]) < MAX_ERRORS:
+                report["errors"].append({"item": number, "reason": str(e)})
+        if len(rows) + invalid >= chunk_size:
+            await flush()
+
+    if rows or invalid:
+        await flush()
+    return report
@@ -0,0 +1,70 @@
+from sqlalchemy import delete, func, update
+from sqlmodel import select
+from ..models.models import Post, Comment
+
+
+# Comment counts live on the rows they describe: posts.comment_count (comments and replies)
+# and comments.reply_count (direct replies). Every write moves them in its own transaction.
+
+def comment_count_delta(post_id: int, delta: int):
+    return (
+        update(Post)
+        .where(Post.id == post_id)
+        .values(comment_count=Post.comment_count + delta)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def reply_count_delta(comment_id: int, delta: int):
+    return (
+        update(Comment)
+        .where(Comment.id == comment_id)
+        .values(reply_count=Comment.reply_count + delta)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def subtree(*where):
+    # the matching comments and every reply below them, WITH RECURSIVE over parent_id
+    tree = select(Comment.id, Comment.post_id, Comment.parent_id).where(*where).cte("subtree", recursive=True)
+    return tree.union(select(Comment.id, Comment.post_id, Comment.parent_id).where(Comment.parent_id == tree.c.id))
+
+
+def delete_thread(comment_id: int):
+    # RETURNING tells how many comments went, for the post's counter
+    tree = subtree(Comment.id == comment_id)
+    return (
+        delete(Comment)
+        .where(Comment.id.in_(select(tree.c.id)))
+        .returning(Comment.id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def remove_user_comment_counts(user_id: int):
+    # used before a user is deleted, their comments and the replies under them go away
+    # with ON DELETE CASCADE
+    tree = subtree(Comment.user_id == user_id)
+
+    per_post = select(tree.c.post_id, func.count().label("n")).group_by(tree.c.post_id).subquery()
+    posts = (
+        update(Post)
+        .where(Post.id == per_post.c.post_id)
+        .values(comment_count=Post.comment_count - per_post.c.n)
+        .execution_options(synchronize_session=False)
+    )
+
+    # comments that stay but lose replies
+    per_parent = (
+        select(tree.c.parent_id, func.count().label("n"))
+        .where(tree.c.parent_id.is_not(None), tree.c.parent_id.not_in(select(tree.c.id)))
+        .group_by(tree.c.parent_id)
+        .subquery()
+    )
+    parents = (
+        update(Comment)
+        .where(Comment.id == per_parent.c.parent_id)
+        .values(reply_count=Comment.reply_count - per_parent.c.n)
+        .execution_options(synchronize_session=False)
+    )
+    return posts, parents
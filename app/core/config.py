@@ -1,3 +1,4 @@
+from typing import Literal
 from pydantic_settings import BaseSettings
 from pydantic import computed_field
 
@@ -8,9 +9,59 @@ class Settings(BaseSettings):
     DB_HOST: str = "localhost"
     DB_PORT: int = 5432
 
+    DB_ECHO: bool = False
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+
     SECRET_KEY: str = "this_is_a_secret"
     ALGORITHM: str = "HS256"
     TOKEN_EXPIRATION_MINUTES: int = 60
+    TOKEN_REVOCATION_REFRESH_SECONDS: int = 5
+
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_QUEUE: int = 64
+    PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS: float = 5.0
+
+    DEFAULT_PAGE_SIZE: int = 20
+    MAX_PAGE_SIZE: int = 100
+
+    PUBLISH_CHUNK_SIZE: int = 500
+    SCHEDULER_RECONCILE_SECONDS: int = 300
+    SCHEDULER_LOCK_ID: int = 72410001
+    SCHEDULER_HEARTBEAT_SECONDS: float = 5
+
+    IMPRESSION_FLUSH_INTERVAL_SECONDS: int = 5
+    IMPRESSION_FLUSH_THRESHOLD: int = 1000
+
+    LEADERBOARD_SIZE: int = 100
+    LEADERBOARD_REFRESH_SECONDS: int = 30
+
+    ROLLUP_INTERVAL_SECONDS: int = 60
+    SERIES_MAX_POINTS: int = 2200
+
+    BULK_REACTION_CHUNK_SIZE: int = 1000
+    EXPORT_BATCH_SIZE: int = 1000
+
+    FEED_FANOUT_MAX_FOLLOWERS: int = 5000
+    FEED_MAX_ENTRIES: int = 800
+    FEED_TRIM_SECONDS: int = 600
+
+    # what a route going over its declared query budget, or repeating a statement more than
+    # QUERY_REPEAT_THRESHOLD times, does: nothing, a warning in the log, or a 500
+    QUERY_BUDGET_MODE: Literal["off", "warn", "raise"] = "warn"
+    QUERY_REPEAT_THRESHOLD: int = 5
+
+    # comma separated postgresql:// URLs of read replicas, empty means every read goes to the primary
+    REPLICA_URLS: str = ""
+    REPLICA_CONNECT_TIMEOUT_SECONDS: int = 2
+    # a replica that failed to connect is skipped for this long
+    REPLICA_RETRY_SECONDS: int = 30
+    # after a write, the user's reads go to the primary for this long (0 turns it off)
+    READ_YOUR_WRITES_SECONDS: float = 5
 
     @computed_field 
     @property
@@ -20,6 +71,14 @@ class Settings(BaseSettings):
             f"{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
         )
 
+    @computed_field
+    @property
+    def ASYNC_DATABASE_URL(self) -> str:
+        return (
+            f"postgresql+asyncpg://{self.DB_USERNAME}:{self.DB_PASSWORD}@"
+            f"{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
+        )
+
     class Config:
         env_file = ".env"
 
@@ -0,0 +1,133 @@
+import argparse
+from datetime import datetime, timezone
+from sqlalchemy import Boolean, Integer, bindparam, delete, func, insert, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from fastapi import HTTPException, status
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from ..models.models import Reaction, PostReactionCount
+from ..models.enums import ReactionType
+from ..models.types import UtcDateTime
+from ..db.session import engine
+
+
+# Per post, per reaction type counters. They are updated in the same transaction
+# as the reaction itself, so reading them is as good as counting `reactions`.
+
+def reaction_count_delta(post_id: int, type: ReactionType, delta: int):
+    query = pg_insert(PostReactionCount).values(post_id=post_id, type=type, count=delta)
+    return query.on_conflict_do_update(
+        index_elements=[PostReactionCount.post_id, PostReactionCount.type],
+        set_={"count": PostReactionCount.count + query.excluded.count},
+    )
+
+
+UPSERT_REACTION = text("""
+    WITH previous AS (
+        SELECT type FROM reactions WHERE post_id = :post_id AND user_id = :user_id
+    ), upserted AS (
+        INSERT INTO reactions (post_id, user_id, type, created_at)
+        VALUES (:post_id, :user_id, CAST(:type AS reactiontype), :created_at)
+        ON CONFLICT (post_id, user_id) DO UPDATE SET type = EXCLUDED.type
+        -- only over the version `previous` read. A row another transaction inserted or
+        -- changed after this statement's snapshot is left alone and nothing comes back
+        WHERE reactions.type IS NOT DISTINCT FROM (SELECT type FROM previous)
+        RETURNING id, post_id, user_id, type, created_at, (xmax = 0) AS inserted
+    ), deltas AS (
+        SELECT type, SUM(delta) AS delta FROM (
+            SELECT type, 1 AS delta FROM upserted
+            UNION ALL
+            SELECT type, -1 FROM previous
+        ) changes
+        -- a new row where the snapshot had one: it was deleted meanwhile, and that delete
+        -- took it off the counters already. Nothing is counted, the caller runs it again
+        WHERE (SELECT inserted FROM upserted) = (NOT EXISTS (SELECT 1 FROM previous))
+        GROUP BY type
+        HAVING SUM(delta) <> 0
+    ), counted AS (
+        INSERT INTO post_reaction_counts (post_id, type, count)
+        SELECT :post_id, type, delta FROM deltas
+        ON CONFLICT (post_id, type) DO UPDATE SET count = post_reaction_counts.count + EXCLUDED.count
+    )
+    SELECT upserted.*, previous.type AS previous_type FROM upserted LEFT JOIN previous ON true
+""").bindparams(
+    bindparam("type", type_=Reaction.__table__.c.type.type),
+    bindparam("created_at", type_=UtcDateTime),
+).columns(
+    id=Integer,
+    post_id=Integer,
+    user_id=Integer,
+    type=Reaction.__table__.c.type.type,
+    created_at=UtcDateTime,
+    inserted=Boolean,
+    previous_type=Reaction.__table__.c.type.type,
+)
+
+# a statement that lost a race with the same user's other request is run again this many times at most
+REACTION_ATTEMPTS = 3
+
+
+def upsert_reaction(post_id: int, user_id: int, type: ReactionType):
+    # insert or change the user's reaction and move the counters, all in one round trip.
+    # `inserted` in the result tells a new reaction from a changed one
+    return UPSERT_REACTION.bindparams(post_id=post_id, user_id=user_id, type=type,
+                                      created_at=datetime.now(timezone.utc))
+
+
+async def save_reaction(session: AsyncSession, post_id: int, user_id: int, type: ReactionType):
+    # READ COMMITTED: when a concurrent request of the same user commits first, the statement
+    # changes nothing (or inserts over a reaction deleted meanwhile) and the transaction is
+    # rolled back. Run again, its snapshot has the other request's reaction
+    for _ in range(REACTION_ATTEMPTS):
+        reaction = (await session.exec(upsert_reaction(post_id, user_id, type))).one_or_none()
+        if reaction is not None and reaction.inserted == (reaction.previous_type is None):
+            await session.commit()
+            return reaction
+        await session.rollback()
+    raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="The reaction was changed concurrently")
+
+
+def remove_user_reaction_counts(user_id: int):
+    # used before a user and their reactions are deleted
+    removed = (
+        select(Reaction.post_id, Reaction.type, func.count().label("n"))
+        .where(Reaction.user_id == user_id)
+        .group_by(Reaction.post_id, Reaction.type)
+        .subquery()
+    )
+    return (
+        update(PostReactionCount)
+        .where(PostReactionCount.post_id == removed.c.post_id, PostReactionCount.type == removed.c.type)
+        .values(count=PostReactionCount.count - removed.c.n)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def get_reaction_counts(post_id: int):
+    return select(PostReactionCount.type, PostReactionCount.count).where(PostReactionCount.post_id == post_id)
+
+
+def rebuild_reaction_counts(session: Session, post_id: int | None = None):
+    # keeps reaction writes out while the counters are recomputed
+    session.exec(text("LOCK TABLE reactions IN SHARE MODE"))
+
+    clear = delete(PostReactionCount)
+    counts = select(Reaction.post_id, Reaction.type, func.count()).group_by(Reaction.post_id, Reaction.type)
+    if post_id is not None:
+        clear = clear.where(PostReactionCount.post_id == post_id)
+        counts = counts.where(Reaction.post_id == post_id)
+
+    session.exec(clear)
+    session.exec(insert(PostReactionCount).from_select(["post_id", "type", "count"], counts))
+    session.commit()
+
+
+if __name__ == "__main__":
+    # python -m app.core.counters rebuild [--post-id ID]
+    parser = argparse.ArgumentParser(description="Maintenance for the reaction counters")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--post-id", type=int, default=None)
+    args = parser.parse_args()
+
+    with Session(engine) as session:
+        rebuild_reaction_counts(session, post_id=args.post_id)
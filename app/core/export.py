@@ -0,0 +1,60 @@
+import csv
+import io
+from datetime import datetime
+from enum import Enum
+import orjson
+from fastapi.responses import StreamingResponse
+from sqlmodel.ext.asyncio.session import AsyncSession
+from ..db.session import async_engine
+from ..models.enums import ExportFormat
+from .config import settings
+from .serialization import ORJSON_OPTIONS
+
+MEDIA_TYPES = {
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.CSV: "text/csv",
+}
+
+
+def csv_value(value):
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+async def export_rows(query, format: ExportFormat):
+    """
+    Streams the rows of `query` from a server side cursor, `EXPORT_BATCH_SIZE` rows
+    at a time, so memory doesn't grow with the export. It has its own session: the
+    request's session is closed before the body is sent.
+    """
+    columns = [column["name"] for column in query.column_descriptions]
+    query = query.execution_options(yield_per=settings.EXPORT_BATCH_SIZE)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if format == ExportFormat.CSV:
+        # the header goes out before the query has even run
+        writer.writerow(columns)
+        yield buffer.getvalue()
+
+    async with AsyncSession(async_engine) as session:
+        result = await session.stream(query)
+        async for rows in result.partitions():
+            if format == ExportFormat.NDJSON:
+                yield b"".join(orjson.dumps(row._asdict(), option=ORJSON_OPTIONS) + b"\n" for row in rows)
+            else:
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerows([csv_value(value) for value in row] for row in rows)
+                yield buffer.getvalue()
+
+
+def export_response(query, format: ExportFormat, filename: str) -> StreamingResponse:
+    return StreamingResponse(
+        export_rows(query, format),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{format.value}"'},
+    )
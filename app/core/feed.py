@@ -0,0 +1,145 @@
+import logging
+from datetime import datetime
+from sqlalchemy import delete, exists, func, literal, true, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from ..models.models import User, Post, Follow, FeedEntry
+from ..models.enums import Status
+from ..db.session import engine
+from .config import settings
+from .pagination import keyset, page
+
+logger = logging.getLogger(__name__)
+
+FEED_CURSOR_TYPES = (datetime.fromisoformat, int)
+# how many of an author's latest posts a new follower gets in their timeline
+BACKFILL_POSTS = 50
+
+
+# Home feed. When a post goes live its id is written to the timeline (`feed_entries`)
+# of every follower of its author, so reading a feed is one range scan of the reader's
+# timeline. Authors with FEED_FANOUT_MAX_FOLLOWERS or more followers would make that
+# write too big; their posts are not fanned out and get merged in at read time instead.
+#
+# Which way a post went is recorded on it (`posts.fanned_out`) when it goes live, and reads
+# go by that rather than by the author's follower count now: an author who crossed the
+# threshold either way since has posts of both kinds, and each is read where it is.
+
+def fan_out(post_ids: list[int]):
+    # one statement in the publishing transaction:
+    # WITH marked AS (UPDATE posts SET fanned_out = true <of authors under the threshold> RETURNING ..)
+    # INSERT INTO feed_entries SELECT <every follower> x <the marked posts>
+    marked = (
+        update(Post)
+        .where(Post.id.in_(post_ids), Post.status == Status.PUBLISHED, Post.user_id == User.id,
+               User.follower_count < settings.FEED_FANOUT_MAX_FOLLOWERS)
+        .values(fanned_out=True)
+        .returning(Post.id, Post.user_id, Post.published_at)
+        .cte("marked")
+    )
+    entries = (
+        select(Follow.follower_id, marked.c.published_at, marked.c.id, marked.c.user_id)
+        .join(Follow, Follow.followee_id == marked.c.user_id)
+    )
+    return (
+        pg_insert(FeedEntry)
+        .from_select(["user_id", "published_at", "post_id", "author_id"], entries)
+        .on_conflict_do_nothing()
+        .add_cte(marked)
+    )
+
+
+def backfill(follower_id: int, author_id: int):
+    # a new follow brings the author's latest posts into the follower's timeline
+    latest = (
+        select(literal(follower_id), Post.published_at, Post.id, Post.user_id)
+        .where(Post.user_id == author_id, Post.status == Status.PUBLISHED, Post.fanned_out)
+        .order_by(Post.published_at.desc(), Post.id.desc())
+        .limit(BACKFILL_POSTS)
+    )
+    return (
+        pg_insert(FeedEntry)
+        .from_select(["user_id", "published_at", "post_id", "author_id"], latest)
+        .on_conflict_do_nothing()
+    )
+
+
+def remove_from_feed(follower_id: int, author_id: int):
+    return delete(FeedEntry).where(FeedEntry.user_id == follower_id, FeedEntry.author_id == author_id)
+
+
+def remove_user_follows(user_id: int):
+    # used before a user is deleted, their follows go away with ON DELETE CASCADE
+    followees = select(Follow.followee_id).where(Follow.follower_id == user_id)
+    return (
+        update(User)
+        .where(User.id.in_(followees))
+        .values(follower_count=User.follower_count - 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def read_feed(session: AsyncSession, user_id: int, columns: tuple, cursor: str | None, limit: int):
+    # `columns` has to include Post.published_at, it is the sort key with the id
+    timeline = keyset(
+        select(*columns).join(FeedEntry, FeedEntry.post_id == Post.id).where(FeedEntry.user_id == user_id),
+        (FeedEntry.published_at, FeedEntry.post_id), FEED_CURSOR_TYPES, cursor, limit,
+    )
+    rows = (await session.exec(timeline)).all()
+
+    # fan-out on read: the next page of the posts that weren't fanned out, of each followed
+    # author who has some. Both are range scans of ix_posts_not_fanned_out, at most limit + 1
+    # rows per author in one LATERAL subquery each
+    not_fanned_out = (Post.status == Status.PUBLISHED, ~Post.fanned_out)
+    authors = (
+        select(Follow.followee_id.label("author_id"))
+        .where(Follow.follower_id == user_id,
+               exists().where(Post.user_id == Follow.followee_id, *not_fanned_out))
+        .subquery()
+    )
+    latest = keyset(
+        select(*columns).where(Post.user_id == authors.c.author_id, *not_fanned_out),
+        (Post.published_at, Post.id), FEED_CURSOR_TYPES, cursor, limit,
+    ).lateral()
+    # the columns spelled out, sqlmodel's select() of a single argument would return scalars
+    pulled = (await session.exec(select(*latest.c).select_from(authors).join(latest, true()))).all()
+
+    # a post is in one or the other, never both
+    ordered = sorted([*rows, *pulled], key=lambda row: (row.published_at, row.id), reverse=True)
+    return page(ordered[:limit + 1], limit, lambda row: (row.published_at, row.id))
+
+
+def trim_feeds() -> int:
+    # keeps the newest FEED_MAX_ENTRIES of each timeline, scrolling past that is the end of the feed.
+    # Only the timelines that are over get ranked. Counting them is an index-only scan of the
+    # primary key, already in user_id order, where ranking every entry meant a sort of the table
+    too_long = (
+        select(FeedEntry.user_id)
+        .group_by(FeedEntry.user_id)
+        .having(func.count() > settings.FEED_MAX_ENTRIES)
+    )
+    ranked = (
+        select(
+            FeedEntry.user_id, FeedEntry.published_at, FeedEntry.post_id,
+            func.row_number().over(
+                partition_by=FeedEntry.user_id,
+                order_by=(FeedEntry.published_at.desc(), FeedEntry.post_id.desc()),
+            ).label("position"),
+        )
+        .where(FeedEntry.user_id.in_(too_long))
+        .subquery()
+    )
+    excess = select(ranked.c.user_id, ranked.c.published_at, ranked.c.post_id).where(
+        ranked.c.position > settings.FEED_MAX_ENTRIES
+    )
+    query = delete(FeedEntry).where(
+        tuple_(FeedEntry.user_id, FeedEntry.published_at, FeedEntry.post_id).in_(excess)
+    )
+    with Session(engine) as session:
+        trimmed = session.exec(query).rowcount
+        session.commit()
+
+    if trimmed:
+        logger.info("trimmed %d feed entries", trimmed)
+    return trimmed
@@ -0,0 +1,88 @@
+import hashlib
+import math
+import zlib
+
+DEFAULT_PRECISION = 12
+
+
+class HyperLogLog:
+    """
+    Estimates how many distinct items were added using 2**precision one-byte registers
+    (4 KB at the default precision, about 1.6% standard error), whatever the count.
+    Sketches merge by taking the max of each register, which is how the workers' and
+    the days' sketches are combined. A sketch with few registers set keeps them in a
+    dict until it is worth allocating the full array.
+    """
+
+    def __init__(self, precision: int = DEFAULT_PRECISION, registers: bytes | None = None):
+        self.precision = precision
+        self.size = 1 << precision
+        self._dense = bytearray(registers) if registers is not None else None
+        self._sparse = {} if registers is None else None
+
+    def add(self, item: str | bytes):
+        if isinstance(item, str):
+            item = item.encode()
+        hashed = int.from_bytes(hashlib.blake2b(item, digest_size=8).digest(), "big")
+        # the first bits pick the register, the position of the first 1 in the rest is the rank
+        index = hashed >> (64 - self.precision)
+        rest = hashed & ((1 << (64 - self.precision)) - 1)
+        self._set(index, 64 - self.precision - rest.bit_length() + 1)
+
+    def merge(self, other: "HyperLogLog"):
+        if other.precision != self.precision:
+            raise ValueError("can't merge sketches of different precision")
+        if other._sparse is not None:
+            for index, rank in other._sparse.items():
+                self._set(index, rank)
+            return
+        if self._dense is None:
+            self._densify()
+        self._dense = bytearray(map(max, self._dense, other._dense))
+
+    def copy(self) -> "HyperLogLog":
+        sketch = HyperLogLog(self.precision)
+        sketch.merge(self)
+        return sketch
+
+    def count(self) -> int:
+        registers = self.registers()
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = alpha * self.size ** 2 / sum(2.0 ** -rank for rank in registers)
+        zeros = registers.count(0)
+        if estimate <= 2.5 * self.size and zeros:
+            # small range correction (linear counting)
+            estimate = self.size * math.log(self.size / zeros)
+        return round(estimate)
+
+    def registers(self) -> bytes:
+        if self._dense is not None:
+            return bytes(self._dense)
+        registers = bytearray(self.size)
+        for index, rank in self._sparse.items():
+            registers[index] = rank
+        return bytes(registers)
+
+    def to_bytes(self) -> bytes:
+        # mostly empty sketches compress to a few dozen bytes
+        return bytes([self.precision]) + zlib.compress(self.registers())
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        precision, registers = data[0], zlib.decompress(data[1:])
+        if len(registers) != 1 << precision:
+            raise ValueError("corrupt sketch")
+        return cls(precision, registers)
+
+    def _set(self, index: int, rank: int):
+        if self._dense is not None:
+            if rank > self._dense[index]:
+                self._dense[index] = rank
+        elif rank > self._sparse.get(index, 0):
+            self._sparse[index] = rank
+            # a dict entry costs more than 32 bytes, past this the array is smaller
+            if len(self._sparse) > self.size // 128:
+                self._densify()
+
+    def _densify(self):
+        self._dense, self._sparse = bytearray(self.registers()), None
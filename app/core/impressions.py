@@ -0,0 +1,155 @@
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from sqlalchemy import case, update
+from sqlmodel import Session
+from ..models.models import Post
+from ..db.session import engine
+from ..db.queries import current_tracker
+from .config import settings
+from .leaderboard import leaderboard, reaction_total
+from .rollups import add_impressions
+from .hll import HyperLogLog
+from .reach import merge_reach
+
+# how long the totals of a flush are kept for the readers whose database read may have come
+# before its commit, far longer than any request takes
+FLUSHED_TTL_SECONDS = 60
+
+
+class ImpressionBuffer:
+    """
+    Collects post views in memory and writes them back in batches, so a
+    page view no longer turns into a row-locking UPDATE on `posts`. Viewers
+    go into a HyperLogLog sketch per post, merged into the stored ones on flush.
+    """
+
+    def __init__(self, threshold: int):
+        self.threshold = threshold
+        self._pending: dict[int, int] = defaultdict(int)
+        self._in_flight: dict[int, int] = {}
+        self._sketches: dict[int, HyperLogLog] = {}
+        self._in_flight_sketches: dict[int, HyperLogLog] = {}
+        # post id -> (impressions after the flush, when)
+        self._flushed: dict[int, tuple[int, float]] = {}
+        self._total = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def record(self, post_id: int, stored: int, viewer: str | None = None) -> int:
+        # `stored` is posts.impressions as the caller read it, returns the impressions
+        # of the post including this view
+        with self._lock:
+            self._pending[post_id] += 1
+            if viewer is not None:
+                self._sketches.setdefault(post_id, HyperLogLog()).add(viewer)
+            self._total += 1
+            impressions = self._impressions(post_id, stored)
+            full = self._total >= self.threshold
+
+        if full:
+            # everyone's views since the last flush, not queries of the request that happened
+            # to fill the buffer: keep them out of its query budget
+            token = current_tracker.set(None)
+            try:
+                self.flush()
+            finally:
+                current_tracker.reset(token)
+        return impressions
+
+    def impressions(self, post_id: int, stored: int) -> int:
+        with self._lock:
+            return self._impressions(post_id, stored)
+
+    def _impressions(self, post_id: int, stored: int) -> int:
+        # the caller's read may be from before the last flush committed or from after, the
+        # flushed total counts the batch once either way, and never less than an earlier answer
+        flushed = self._flushed.get(post_id)
+        if flushed is not None:
+            stored = max(stored, flushed[0])
+        return stored + self._pending.get(post_id, 0) + self._in_flight.get(post_id, 0)
+
+    def pending(self, post_id: int) -> int:
+        with self._lock:
+            return self._pending.get(post_id, 0) + self._in_flight.get(post_id, 0)
+
+    def pending_viewers(self, post_id: int) -> HyperLogLog | None:
+        # record() adds to the pending sketch under the lock, so it is copied under the lock too
+        with self._lock:
+            sketches = [s[post_id] for s in (self._sketches, self._in_flight_sketches) if post_id in s]
+            if not sketches:
+                return None
+            merged = sketches[0].copy()
+            for sketch in sketches[1:]:
+                merged.merge(sketch)
+        return merged
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch = dict(self._pending)
+                sketches = self._sketches
+                self._in_flight = batch
+                self._in_flight_sketches = sketches
+                self._pending = defaultdict(int)
+                self._sketches = {}
+                self._total = 0
+
+            replaced = {}
+            try:
+                # one statement for the whole batch:
+                # UPDATE posts SET impressions = impressions + CASE id WHEN .. END WHERE id IN (..)
+                query = (
+                    update(Post)
+                    .where(Post.id.in_(batch.keys()))
+                    .values(impressions=Post.impressions + case(batch, value=Post.id, else_=0))
+                    .returning(Post.id, Post.title, Post.impressions, reaction_total(Post.id))
+                    .execution_options(synchronize_session=False)
+                )
+                with Session(engine) as session:
+                    updated = session.exec(query).all()
+                    # posts deleted since the view are gone from `updated`, the UPDATE
+                    # keeps the others locked until the commit
+                    existing = {row.id for row in updated}
+                    now = datetime.now(timezone.utc)
+                    add_impressions(session, {id: n for id, n in batch.items() if id in existing}, now)
+                    merge_reach(session, {id: s for id, s in sketches.items() if id in existing}, now)
+
+                    # the new totals take over from the in-flight views before the commit: until it
+                    # lands a reader's database read is older than them, after it the same.
+                    # Sketches stay in flight until then, merging one twice changes nothing
+                    with self._lock:
+                        at = time.monotonic()
+                        self._flushed = {id: entry for id, entry in self._flushed.items()
+                                         if entry[1] > at - FLUSHED_TTL_SECONDS}
+                        replaced = {row.id: self._flushed.get(row.id) for row in updated}
+                        self._flushed.update({row.id: (row.impressions, at) for row in updated})
+                        self._in_flight = {}
+                    session.commit()
+            except Exception:
+                # put the views back so the next flush retries them
+                with self._lock:
+                    for post_id, entry in replaced.items():
+                        if entry is None:
+                            self._flushed.pop(post_id, None)
+                        else:
+                            self._flushed[post_id] = entry
+                    for post_id, count in batch.items():
+                        self._pending[post_id] += count
+                        self._total += count
+                    for post_id, sketch in sketches.items():
+                        self._sketches.setdefault(post_id, HyperLogLog()).merge(sketch)
+                raise
+            finally:
+                with self._lock:
+                    self._in_flight = {}
+                    self._in_flight_sketches = {}
+
+            leaderboard.offer(updated)
+            return sum(batch.values())
+
+
+impression_buffer = ImpressionBuffer(threshold=settings.IMPRESSION_FLUSH_THRESHOLD)
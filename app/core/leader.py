@@ -0,0 +1,120 @@
+import logging
+import select
+import threading
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+from ..db.session import DATABASE_URL, engine
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderElection:
+    """
+    Picks one process per cluster to run the scheduling jobs, using a PostgreSQL
+    advisory lock held by a dedicated connection. Every other worker is a hot
+    standby that retries the lock every heartbeat; when the leader dies its
+    connection goes away, Postgres releases the lock and a standby takes over
+    within a heartbeat.
+
+    The leader also LISTENs on `channels` over the same connection, which is how
+    the other workers hand it work (see schedule_queue.notify_scheduled).
+    """
+
+    def __init__(self, lock_id: int, heartbeat_seconds: float, on_elected=None, on_demoted=None,
+                 channels: dict | None = None):
+        self.lock_id = lock_id
+        self.heartbeat_seconds = heartbeat_seconds
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.channels = channels or {}
+        self.is_leader = False
+        self._engine = None
+        self._connection = None
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if engine.dialect.name != "postgresql":
+            # no advisory locks, a single process is the only sensible setup anyway
+            self._promote()
+            return
+
+        # outside the regular pool, the connection lives as long as the leadership
+        self._engine = create_engine(DATABASE_URL, poolclass=NullPool)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="leader-election", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._step_down()
+        if self._engine is not None:
+            self._engine.dispose()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self._connection is None:
+                    self._try_acquire()
+                    if self._connection is None:
+                        self._stop.wait(self.heartbeat_seconds)
+                else:
+                    self._wait_and_heartbeat()
+            except Exception:
+                logger.exception("lost the scheduler leadership")
+                self._step_down()
+                self._stop.wait(self.heartbeat_seconds)
+
+    def _try_acquire(self):
+        connection = self._engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+        acquired = connection.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": self.lock_id}).scalar()
+        if not acquired:
+            connection.close()
+            return
+
+        for channel in self.channels:
+            connection.execute(text(f'LISTEN "{channel}"'))
+        self._connection = connection
+        logger.info("this process is now the scheduler leader")
+        self._promote()
+
+    def _wait_and_heartbeat(self):
+        raw = self._connection.connection.dbapi_connection
+        ready, _, _ = select.select([raw], [], [], self.heartbeat_seconds)
+        if ready:
+            raw.poll()
+            while raw.notifies:
+                notification = raw.notifies.pop(0)
+                handler = self.channels.get(notification.channel)
+                if handler is not None:
+                    handler(notification.payload)
+        else:
+            # the lock is ours for as long as this session is alive
+            self._connection.execute(text("SELECT 1"))
+
+    def _promote(self):
+        self.is_leader = True
+        if self.on_elected is not None:
+            self.on_elected()
+
+    def _step_down(self):
+        was_leader = self.is_leader
+        self.is_leader = False
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except Exception:
+                pass
+            self._connection = None
+        if was_leader and self.on_demoted is not None:
+            self.on_demoted()
+
+
+def leader_only(election: LeaderElection, job):
+    def run():
+        if election.is_leader:
+            return job()
+    run.__name__ = job.__name__
+    return run
@@ -0,0 +1,94 @@
+import threading
+from datetime import datetime, timezone
+from sqlalchemy import func
+from sqlmodel import Session, select
+from ..models.models import Post, PostReactionCount
+from ..db.session import engine
+from .config import settings
+
+
+def reaction_total(post_id_column):
+    return (
+        select(func.coalesce(func.sum(PostReactionCount.count), 0))
+        .where(PostReactionCount.post_id == post_id_column)
+        .scalar_subquery()
+    )
+
+
+class Leaderboard:
+    """
+    Top posts by impressions, kept in memory so /analytics/posts/top doesn't scan
+    `posts` and `reactions` on every call. Serves up to `size` posts, tracks twice
+    as many so deleted posts don't leave holes until the next refresh.
+
+    Staleness: impression flushes and reactions made by this worker are applied
+    right away; everything else (other workers, bulk imports) shows up on the next
+    refresh, every LEADERBOARD_REFRESH_SECONDS. Impressions themselves reach the
+    database up to IMPRESSION_FLUSH_INTERVAL_SECONDS after the view.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.capacity = 2 * size
+        self.refreshed_at: datetime | None = None
+        self._entries: dict[int, dict] = {}
+        self._ranked: list[dict] = []
+        self._lock = threading.Lock()
+
+    def top(self, limit: int) -> list[dict]:
+        return self._ranked[:limit]
+
+    def refresh(self):
+        top = select(Post.id, Post.title, Post.impressions).order_by(Post.impressions.desc(), Post.id).limit(self.capacity)
+        top = top.subquery()
+        query = select(top.c.id, top.c.title, top.c.impressions, reaction_total(top.c.id))
+
+        # on the primary: impressions are written there by the flush, a lagging replica would
+        # hand back lower counts than the ones offer() has already applied
+        with Session(engine) as session:
+            rows = session.exec(query).all()
+
+        with self._lock:
+            # a rebuild from scratch, the old cutoff would drop rows tied with or below it
+            self._entries = {}
+            self._ranked = []
+            self._offer(rows)
+            self.refreshed_at = datetime.now(timezone.utc)
+
+    def offer(self, rows):
+        # rows of (id, title, impressions, total_reactions) with fresh impression counts
+        with self._lock:
+            self._offer(rows)
+
+    def add_reactions(self, post_id: int, delta: int):
+        with self._lock:
+            entry = self._entries.get(post_id)
+            if entry is not None:
+                self._entries[post_id] = entry | {"total_reactions": entry["total_reactions"] + delta}
+                self._rank()
+
+    def remove(self, post_id: int):
+        with self._lock:
+            if self._entries.pop(post_id, None) is not None:
+                self._rank()
+
+    def _offer(self, rows):
+        lowest = self._ranked[-1]["impressions"] if len(self._ranked) >= self.capacity else -1
+        for id, title, impressions, total_reactions in rows:
+            if id in self._entries or impressions > lowest:
+                self._entries[id] = {
+                    "id": id,
+                    "title": title,
+                    "impressions": impressions,
+                    "total_reactions": total_reactions,
+                }
+        self._rank()
+
+    def _rank(self):
+        ranked = sorted(self._entries.values(), key=lambda e: (-e["impressions"], e["id"]))[:self.capacity]
+        self._entries = {entry["id"]: entry for entry in ranked}
+        # readers get the list reference without taking the lock, so it is replaced, never mutated
+        self._ranked = ranked
+
+
+leaderboard = Leaderboard(size=settings.LEADERBOARD_SIZE)
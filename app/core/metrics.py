@@ -0,0 +1,210 @@
+import functools
+import threading
+import time
+from bisect import bisect_left
+from ..db.queries import observers, track_queries
+
+# Prometheus text format, written by hand: a handful of counters and histograms don't
+# need a client library. Everything is per process, each worker is scraped on its own.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+JOB_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+# scheduled posts go out within a second when the queue is on time, up to the reconcile
+# interval when it missed them
+PUBLISH_LAG_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 600.0)
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+class Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def label_text(self, values: tuple, extra: str = "") -> str:
+        pairs = [f'{label}="{escape(str(value))}"' for label, value in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            values = [(labels, self.copy(value)) for labels, value in self._values.items()]
+        for labels, value in values:
+            lines += self.samples(labels, value)
+        return lines
+
+    def copy(self, value):
+        return value
+
+    def samples(self, labels: tuple, value) -> list[str]:
+        return [f"{self.name}{self.label_text(labels)} {value}"]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+
+    def observe(self, value: float, *labels):
+        # one slot per bucket plus +Inf, not cumulative until rendered
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(labels, (None, 0.0))
+            if counts is None:
+                counts = [0] * (len(self.buckets) + 1)
+            counts[index] += 1
+            self._values[labels] = (counts, total + value)
+
+    def copy(self, value):
+        counts, total = value
+        return list(counts), total
+
+    def samples(self, labels: tuple, value) -> list[str]:
+        counts, total = value
+        lines, cumulative = [], 0
+        for bound, count in zip((*self.buckets, "+Inf"), counts):
+            cumulative += count
+            le = f'le="{bound}"'
+            lines.append(f"{self.name}_bucket{self.label_text(labels, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{self.label_text(labels)} {total}")
+        lines.append(f"{self.name}_count{self.label_text(labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self.metrics for line in metric.render()) + "\n"
+
+
+registry = Registry()
+
+http_requests_in_flight = registry.register(Gauge(
+    "http_requests_in_flight", "Requests being handled right now"))
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "Request latency by route template and status",
+    ("method", "route", "status")))
+db_queries_per_request = registry.register(Histogram(
+    "http_request_db_queries", "SQL statements run by one request", ("method", "route"), QUERY_COUNT_BUCKETS))
+db_time_per_request = registry.register(Histogram(
+    "http_request_db_seconds", "Time one request spent in SQL statements", ("method", "route")))
+db_queries = registry.register(Counter(
+    "db_queries_total", "SQL statements run, requests and background jobs"))
+db_query_seconds = registry.register(Counter(
+    "db_query_seconds_total", "Time spent in SQL statements, requests and background jobs"))
+job_duration = registry.register(Histogram(
+    "scheduler_job_duration_seconds", "Scheduler job run time", ("job",), JOB_BUCKETS))
+job_failures = registry.register(Counter(
+    "scheduler_job_failures_total", "Scheduler job runs that raised", ("job",)))
+scheduled_posts_claimed = registry.register(Counter(
+    "scheduled_posts_claimed_total", "Due scheduled posts claimed by the publisher"))
+scheduled_posts_published = registry.register(Counter(
+    "scheduled_posts_published_total", "Scheduled posts published, claimed and committed"))
+publish_lag = registry.register(Histogram(
+    "scheduled_post_publish_lag_seconds", "How long after scheduled_at a post went out",
+    buckets=PUBLISH_LAG_BUCKETS))
+last_publish_max_lag = registry.register(Gauge(
+    "scheduler_last_publish_max_lag_seconds", "Largest publish lag of the last run that published posts"))
+
+
+def count_query(statement: str, elapsed: float):
+    db_queries.inc()
+    db_query_seconds.inc(amount=elapsed)
+
+
+observers.append(count_query)
+
+
+class MetricsMiddleware:
+    """
+    Plain ASGI middleware (BaseHTTPMiddleware would add a task per request). Requests are
+    labelled with the route template, `/posts/{id}` rather than `/posts/42`, so the
+    number of series stays fixed; paths that match no route are `unmatched`.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        with track_queries() as queries:
+            http_requests_in_flight.inc()
+            started = time.perf_counter()
+            try:
+                await self.app(scope, receive, send_status)
+            finally:
+                elapsed = time.perf_counter() - started
+                http_requests_in_flight.dec()
+
+                # the router puts the matched route in the scope
+                route = scope.get("route")
+                template = getattr(route, "path", "unmatched")
+                queries.route = f"{scope['method']} {template}"
+                http_request_duration.observe(elapsed, scope["method"], template, status)
+                db_queries_per_request.observe(queries.count, scope["method"], template)
+                db_time_per_request.observe(queries.seconds, scope["method"], template)
+
+
+def timed_job(job):
+    # labelled with the qualified name, the leaderboard's and the revocations' refresh are different jobs
+    name = job.__qualname__
+
+    @functools.wraps(job)
+    def run(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return job(*args, **kwargs)
+        except Exception:
+            job_failures.inc(name)
+            raise
+        finally:
+            job_duration.observe(time.perf_counter() - started, name)
+    return run
@@ -0,0 +1,47 @@
+import base64
+import json
+from datetime import datetime
+from fastapi import HTTPException, status
+from sqlalchemy import literal, tuple_
+
+
+# Keyset (cursor) pagination. The cursor is the sort key of the last row of a page,
+# so every page is an index range scan no matter how deep the client goes.
+
+def encode_cursor(*values) -> str:
+    values = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, *types) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError
+        return tuple(type_(value) for type_, value in zip(types, values))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def keyset(query, columns: tuple, types: tuple, cursor: str | None, limit: int, descending: bool = True):
+    if cursor is not None:
+        # bound with the column types, so values get the same conversion as the columns
+        after = tuple_(*(literal(value, type_=column.type) for column, value in zip(columns, decode_cursor(cursor, *types))))
+        if descending:
+            query = query.where(tuple_(*columns) < after)
+        else:
+            query = query.where(tuple_(*columns) > after)
+
+    order = [c.desc() for c in columns] if descending else list(columns)
+    # one extra row tells us whether there is a next page
+    return query.order_by(*order).limit(limit + 1)
+
+
+def page(rows, limit: int, key) -> tuple[list, str | None]:
+    rows = list(rows)
+    if len(rows) <= limit:
+        return rows, None
+    items = rows[:limit]
+    return items, encode_cursor(*key(items[-1]))
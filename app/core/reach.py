@@ -0,0 +1,47 @@
+from datetime import datetime, timezone
+from sqlalchemy import tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlmodel import Session, select
+from ..models.models import PostReachSketch
+from ..models.enums import Granularity
+from ..models.types import as_utc
+from .hll import HyperLogLog
+from .rollups import truncate
+
+# bucket_start of the row holding a post's all-time viewers, the other rows are days
+ALL_TIME = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def merge_reach(session: Session, sketches: dict[int, HyperLogLog], at: datetime):
+    # called by the impression flush, inside its transaction
+    day = truncate(as_utc(at), Granularity.DAY)
+    keys = sorted((post_id, bucket) for post_id in sketches for bucket in (ALL_TIME, day))
+    if not keys:
+        return
+
+    # create the missing rows first, so a flush on another worker waits on the row locks
+    # below instead of both inserting and one overwriting the other
+    empty = HyperLogLog().to_bytes()
+    session.exec(
+        pg_insert(PostReachSketch)
+        .values([{"post_id": post_id, "bucket_start": bucket, "sketch": empty} for post_id, bucket in keys])
+        .on_conflict_do_nothing()
+    )
+
+    # locked in key order, two flushes can't deadlock on these
+    query = (
+        select(PostReachSketch)
+        .where(tuple_(PostReachSketch.post_id, PostReachSketch.bucket_start).in_(keys))
+        .order_by(PostReachSketch.post_id, PostReachSketch.bucket_start)
+        .with_for_update()
+    )
+    for row in session.exec(query).all():
+        sketch = HyperLogLog.from_bytes(row.sketch)
+        sketch.merge(sketches[row.post_id])
+        row.sketch = sketch.to_bytes()
+        session.add(row)
+
+
+def reach_sketch(post_id: int, bucket: datetime = ALL_TIME):
+    return select(PostReachSketch.sketch).where(PostReachSketch.post_id == post_id,
+                                                PostReachSketch.bucket_start == bucket)
@@ -0,0 +1,101 @@
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlmodel import Session, select
+from ..models.models import Reaction, PostMetricRollup, RollupWatermark
+from ..models.enums import MetricType, Granularity
+from ..models.types import UtcDateTime, as_utc
+from ..db.session import engine
+
+logger = logging.getLogger(__name__)
+
+REACTIONS_WATERMARK = "reactions"
+# created_at is set before the commit, slow transactions get this long to land
+SAFETY_LAG = timedelta(minutes=1)
+# the first run backfills history one window (one transaction) at a time
+WINDOW = timedelta(days=1)
+UPSERT_CHUNK = 1000
+
+BUCKET_SIZE = {
+    Granularity.HOUR: timedelta(hours=1),
+    Granularity.DAY: timedelta(days=1),
+}
+
+
+def truncate(value: datetime, granularity: Granularity) -> datetime:
+    value = value.replace(minute=0, second=0, microsecond=0)
+    if granularity == Granularity.DAY:
+        value = value.replace(hour=0)
+    return value
+
+
+def add_to_buckets(counts: dict, post_id: int, metric: MetricType, at: datetime, value: int):
+    for granularity in Granularity:
+        counts[(post_id, metric, granularity, truncate(at, granularity))] += value
+
+
+def rollup_upserts(counts: dict):
+    # statements only, so the async routes can run them too
+    rows = [
+        {"post_id": post_id, "metric": metric, "granularity": granularity, "bucket_start": bucket, "value": value}
+        for (post_id, metric, granularity, bucket), value in counts.items()
+    ]
+    for i in range(0, len(rows), UPSERT_CHUNK):
+        query = pg_insert(PostMetricRollup).values(rows[i:i + UPSERT_CHUNK])
+        yield query.on_conflict_do_update(
+            index_elements=[PostMetricRollup.post_id, PostMetricRollup.metric,
+                            PostMetricRollup.granularity, PostMetricRollup.bucket_start],
+            set_={"value": PostMetricRollup.value + query.excluded.value},
+        )
+
+
+def write_rollups(session: Session, counts: dict):
+    for query in rollup_upserts(counts):
+        session.exec(query)
+
+
+def add_impressions(session: Session, batch: dict[int, int], at: datetime):
+    # called by the impression flush, inside its transaction
+    counts = defaultdict(int)
+    for post_id, views in batch.items():
+        add_to_buckets(counts, post_id, MetricType.IMPRESSION, as_utc(at), views)
+    write_rollups(session, counts)
+
+
+def aggregate_reactions() -> int:
+    """Rolls reactions created since the last run into ENGAGEMENT buckets."""
+    until = datetime.now(timezone.utc) - SAFETY_LAG
+    hour = func.date_trunc("hour", Reaction.created_at, type_=UtcDateTime)
+    aggregated = 0
+
+    with Session(engine) as session:
+        watermark = session.get(RollupWatermark, REACTIONS_WATERMARK, with_for_update=True)
+        if watermark is None:
+            first = session.exec(select(func.min(Reaction.created_at))).one()
+            if first is None:
+                return 0
+            watermark = RollupWatermark(name=REACTIONS_WATERMARK, value=first - timedelta(microseconds=1))
+
+        while watermark.value < until:
+            end = min(watermark.value + WINDOW, until)
+            query = (
+                select(Reaction.post_id, hour, func.count())
+                .where(Reaction.created_at > watermark.value, Reaction.created_at <= end)
+                .group_by(Reaction.post_id, hour)
+            )
+
+            counts = defaultdict(int)
+            for post_id, bucket, reactions in session.exec(query).all():
+                add_to_buckets(counts, post_id, MetricType.ENGAGEMENT, bucket, reactions)
+                aggregated += reactions
+            write_rollups(session, counts)
+
+            watermark.value = end
+            session.add(watermark)
+            session.commit()
+
+    if aggregated:
+        logger.info("rolled up %d reactions", aggregated)
+    return aggregated
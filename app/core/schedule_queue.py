@@ -0,0 +1,155 @@
+import heapq
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from sqlmodel import Session, select, text
+from ..models.models import Post
+from ..models.enums import Status
+from ..models.types import as_utc
+from ..db.session import engine
+from .config import settings
+from .scheduler import publish_scheduled_posts
+from .leader import LeaderElection
+
+logger = logging.getLogger(__name__)
+
+SCHEDULED_CHANNEL = "post_scheduled"
+
+
+class ScheduleQueue:
+    """
+    Min-heap of (scheduled_at, post_id) for the posts due soon. A background thread
+    sleeps until the earliest deadline and then runs the batch publisher, so posts go
+    out on time without polling `posts`.
+
+    Only the scheduler leader runs the queue. It is filled from the database when
+    the process becomes leader and on every reconciliation, and kept up to date in
+    between by the notifications create_posts/update_posts send from any worker.
+    The reconciliation poll also publishes anything the heap missed (crashes, lost
+    notifications), so it is the upper bound on publish lag.
+    """
+
+    def __init__(self, horizon: timedelta):
+        self.horizon = horizon
+        self._heap: list[tuple[datetime, int]] = []
+        self._deadlines: dict[int, datetime] = {}
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._stopped = False
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and not self._stopped
+
+    def push(self, post_id: int, scheduled_at: datetime):
+        at = as_utc(scheduled_at)
+        with self._cond:
+            if not self.running:
+                return
+            self._deadlines[post_id] = at
+            heapq.heappush(self._heap, (at, post_id))
+            # wake the thread up if this is the new earliest deadline
+            if self._heap[0] == (at, post_id):
+                self._cond.notify()
+
+    def discard(self, post_id: int):
+        # the stale heap entry is skipped once it reaches the top
+        with self._cond:
+            self._deadlines.pop(post_id, None)
+
+    def load(self):
+        until = datetime.now(timezone.utc) + self.horizon
+        query = select(Post.id, Post.scheduled_at).where(Post.status == Status.SCHEDULED,
+                                                         Post.scheduled_at <= until)
+        with Session(engine) as session:
+            due = session.exec(query).all()
+
+        with self._cond:
+            # merged rather than replaced, a push may have landed while the query ran
+            self._deadlines.update({post_id: as_utc(scheduled_at) for post_id, scheduled_at in due})
+            self._heap = [(at, post_id) for post_id, at in self._deadlines.items()]
+            heapq.heapify(self._heap)
+            self._cond.notify()
+
+    def handle_notification(self, payload: str):
+        post_id, scheduled_at = payload.split(" ", 1)
+        self.push(int(post_id), datetime.fromisoformat(scheduled_at))
+
+    def reconcile(self):
+        publish_scheduled_posts()
+        self.load()
+
+    def start(self):
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="schedule-queue", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._heap = []
+            self._deadlines = {}
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _pop_due(self, now: datetime) -> bool:
+        found = False
+        while self._heap:
+            at, post_id = self._heap[0]
+            if self._deadlines.get(post_id) != at:
+                heapq.heappop(self._heap)
+                continue
+            if at > now:
+                break
+            heapq.heappop(self._heap)
+            del self._deadlines[post_id]
+            found = True
+        return found
+
+    def _next_delay(self, now: datetime) -> float | None:
+        if not self._heap:
+            return None
+        return max((self._heap[0][0] - now).total_seconds(), 0)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+                now = datetime.now(timezone.utc)
+                if not self._pop_due(now):
+                    self._cond.wait(timeout=self._next_delay(now))
+                    continue
+
+            # everything due is claimed in one go by the publisher, outside the lock
+            try:
+                publish_scheduled_posts()
+            except Exception:
+                logger.exception("publishing scheduled posts failed")
+
+
+schedule_queue = ScheduleQueue(horizon=timedelta(seconds=2 * settings.SCHEDULER_RECONCILE_SECONDS))
+
+
+def on_elected():
+    schedule_queue.start()
+    schedule_queue.reconcile()
+
+
+scheduler_leader = LeaderElection(lock_id=settings.SCHEDULER_LOCK_ID,
+                                  heartbeat_seconds=settings.SCHEDULER_HEARTBEAT_SECONDS,
+                                  on_elected=on_elected,
+                                  on_demoted=schedule_queue.stop,
+                                  channels={SCHEDULED_CHANNEL: schedule_queue.handle_notification})
+
+
+async def notify_scheduled(session, post_id: int, scheduled_at: datetime):
+    # sent inside the caller's transaction, the leader only hears about committed posts
+    if session.bind.dialect.name == "postgresql":
+        payload = f"{post_id} {as_utc(scheduled_at).isoformat()}"
+        await session.exec(text("SELECT pg_notify(:channel, :payload)")
+                           .bindparams(channel=SCHEDULED_CHANNEL, payload=payload))
+    else:
+        schedule_queue.push(post_id, scheduled_at)
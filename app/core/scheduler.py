@@ -1,20 +1,105 @@
+import logging
+import time
+from dataclasses import dataclass
 from apscheduler.schedulers.background import BackgroundScheduler
 from datetime import datetime, timezone
+from sqlalchemy import update
 from sqlmodel import select, Session
 from ..models.models import Post
 from ..models.enums import Status
 from ..db.session import engine
+from .config import settings
+from .feed import fan_out
+from .metrics import (timed_job, scheduled_posts_claimed, scheduled_posts_published, publish_lag,
+                      last_publish_max_lag)
 
-def publish_scheduled_posts():
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PublishReport:
+    published: int = 0
+    chunks: int = 0
+    elapsed_ms: float = 0.0
+    # how long after scheduled_at the posts actually went out
+    max_lag_ms: float = 0.0
+    total_lag_ms: float = 0.0
+
+    @property
+    def mean_lag_ms(self) -> float:
+        return round(self.total_lag_ms / self.published, 2) if self.published else 0.0
+
+
+last_publish_report = PublishReport()
+
+
+def publish_lag_ms(scheduled_at: datetime, published_at: datetime) -> float:
+    if scheduled_at.tzinfo is None:
+        scheduled_at = scheduled_at.replace(tzinfo=timezone.utc)
+    return max((published_at - scheduled_at).total_seconds() * 1000, 0.0)
+
+
+def claim_due_posts(now: datetime, chunk_size: int):
+    # SKIP LOCKED lets concurrent runs split the due posts instead of waiting on each other
+    due = (
+        select(Post.id)
+        .where(Post.status == Status.SCHEDULED, Post.scheduled_at <= now)
+        .order_by(Post.scheduled_at)
+        .limit(chunk_size)
+        .with_for_update(skip_locked=True)
+    )
+    return (
+        update(Post)
+        .where(Post.id.in_(due))
+        .values(status=Status.PUBLISHED, published_at=datetime.now(timezone.utc))
+        .returning(Post.id, Post.user_id, Post.title, Post.scheduled_at)
+        .execution_options(synchronize_session=False)
+    )
+
+
+@timed_job
+def publish_scheduled_posts(chunk_size: int = settings.PUBLISH_CHUNK_SIZE) -> PublishReport:
+    global last_publish_report
+
+    started = time.perf_counter()
     now = datetime.now(timezone.utc)
+    report = PublishReport()
+
     with Session(engine) as session:
-        query = select(Post).where(Post.status == "SCHEDULED", Post.scheduled_at <= now)
-        posts_to_publish = session.exec(query).all()
-        for post in posts_to_publish:
-            fake_linkedin_api_call(post)
-            post.status = Status.PUBLISHED
-            session.add(post)
+        while True:
+            # one UPDATE ... RETURNING claims a whole chunk, one commit publishes it
+            posts = session.exec(claim_due_posts(now, chunk_size)).all()
+            if not posts:
+                break
+            scheduled_posts_claimed.inc(amount=len(posts))
+
+            for post in posts:
+                fake_linkedin_api_call(post)
+            session.exec(fan_out([post.id for post in posts]))
             session.commit()
+            scheduled_posts_published.inc(amount=len(posts))
+
+            published_at = datetime.now(timezone.utc)
+            for post in posts:
+                lag = publish_lag_ms(post.scheduled_at, published_at)
+                report.total_lag_ms += lag
+                report.max_lag_ms = max(report.max_lag_ms, lag)
+                publish_lag.observe(lag / 1000)
+
+            report.published += len(posts)
+            report.chunks += 1
+            if len(posts) < chunk_size:
+                break
+
+    report.elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+    last_publish_report = report
+    if report.published:
+        last_publish_max_lag.set(report.max_lag_ms / 1000)
+        logger.info("published %d scheduled posts in %d chunks (%.1f ms), lag mean %.1f ms max %.1f ms",
+                    report.published, report.chunks, report.elapsed_ms,
+                    report.mean_lag_ms, report.max_lag_ms)
+    return report
+
 
 def fake_linkedin_api_call(post: Post):
-    print(f"-----Publishing post with ID: {post.id}")
\ No newline at end of file
+    logger.info("publishing post %d", post.id)
@@ -0,0 +1,114 @@
+import re
+import threading
+from collections import defaultdict
+from sqlalchemy import Float, func, literal_column
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from ..models.models import Post, SEARCH_VECTOR
+from ..models.enums import Status
+from ..db.session import engine
+from .pagination import keyset, page, decode_cursor, encode_cursor
+
+# results are ordered by (rank, id) descending, which is also the cursor
+SEARCH_CURSOR_TYPES = (float, int)
+TOKEN = re.compile(r"\w+")
+
+
+class PostgresSearch:
+    """
+    Matches `posts.search_vector` (generated from title and body, GIN indexed) against
+    websearch_to_tsquery, so `"exact phrase"`, `or` and `-word` work. Ranked with
+    ts_rank_cd, title matches weigh more. The database keeps the index up to date,
+    the hooks below have nothing to do.
+    """
+
+    def load(self):
+        pass
+
+    def index(self, post: Post):
+        pass
+
+    def remove(self, post_id: int):
+        pass
+
+    async def search(self, session: AsyncSession, q: str, columns: tuple, cursor: str | None, limit: int):
+        ts_query = func.websearch_to_tsquery("english", q)
+        vector = literal_column(f"posts.{SEARCH_VECTOR}", type_=TSVECTOR)
+        rank = func.ts_rank_cd(vector, ts_query, type_=Float)
+
+        query = select(*columns, rank.label("rank")).where(vector.op("@@")(ts_query), Post.status == Status.PUBLISHED)
+        query = keyset(query, (rank, Post.id), SEARCH_CURSOR_TYPES, cursor, limit)
+        return page((await session.exec(query)).all(), limit, lambda row: (row.rank, row.id))
+
+
+def tokens(text: str) -> list[str]:
+    return TOKEN.findall(text.lower())
+
+
+class InvertedIndex:
+    """
+    In-process fallback for databases without full-text search (local and test runs).
+    Terms are lowercased words, no stemming. A post matches when it has every term of
+    the query, ranked by how often they appear, title words counting double. Only sees
+    the posts of this process, so it isn't meant for several workers.
+    """
+
+    def __init__(self):
+        self._postings: dict[str, dict[int, int]] = defaultdict(dict)
+        self._terms: dict[int, set[str]] = {}
+        self._lock = threading.Lock()
+
+    def load(self):
+        with Session(engine) as session:
+            posts = session.exec(select(Post.id, Post.title, Post.body)).all()
+        for post in posts:
+            self.index(post)
+
+    def index(self, post: Post):
+        weights = defaultdict(int)
+        for term in tokens(post.title):
+            weights[term] += 2
+        for term in tokens(post.body):
+            weights[term] += 1
+
+        with self._lock:
+            self._remove(post.id)
+            for term, weight in weights.items():
+                self._postings[term][post.id] = weight
+            self._terms[post.id] = set(weights)
+
+    def remove(self, post_id: int):
+        with self._lock:
+            self._remove(post_id)
+
+    def _remove(self, post_id: int):
+        for term in self._terms.pop(post_id, ()):
+            postings = self._postings[term]
+            postings.pop(post_id, None)
+            if not postings:
+                del self._postings[term]
+
+    def ranked(self, q: str) -> list[tuple[int, int]]:
+        terms = set(tokens(q))
+        if not terms:
+            return []
+        with self._lock:
+            postings = sorted((self._postings.get(term, {}) for term in terms), key=len)
+            ids = set(postings[0]).intersection(*postings[1:])
+            return sorted(((sum(p[id] for p in postings), id) for id in ids), reverse=True)
+
+    async def search(self, session: AsyncSession, q: str, columns: tuple, cursor: str | None, limit: int):
+        ranked = self.ranked(q)
+        if cursor is not None:
+            after = decode_cursor(cursor, *SEARCH_CURSOR_TYPES)
+            ranked = [entry for entry in ranked if entry < after]
+
+        ranks = {id: rank for rank, id in ranked[:limit]}
+        query = select(*columns).where(Post.id.in_(ranks), Post.status == Status.PUBLISHED)
+        rows = sorted((await session.exec(query)).all(), key=lambda row: (ranks[row.id], row.id), reverse=True)
+        next_cursor = encode_cursor(*ranked[limit - 1]) if len(ranked) > limit else None
+        return rows, next_cursor
+
+
+search_index = PostgresSearch() if engine.dialect.name == "postgresql" else InvertedIndex()
@@ -0,0 +1,124 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from fastapi import HTTPException, status
+from sqlmodel import Session, select
+from sqlalchemy import delete
+from ..models.models import TokenRevocation
+from ..db.session import engine
+from .config import settings
+
+# token_version recorded for deleted users, no token can reach it
+USER_DELETED = 2**31 - 1
+
+
+class RevocationTable:
+    """
+    In-process copy of the recent rows of `token_revocations`: user id -> lowest
+    token version still accepted. Only revocations younger than the token lifetime
+    matter, anything older only concerns tokens that have expired anyway, so the
+    table stays small.
+
+    Writes made by this process are applied right away, the ones made by other
+    workers show up on the next refresh (every TOKEN_REVOCATION_REFRESH_SECONDS).
+    """
+
+    def __init__(self, token_lifetime: timedelta, overlap: timedelta = timedelta(seconds=30)):
+        self.token_lifetime = token_lifetime
+        # rows can commit a bit after their created_at, so each refresh re-reads a short overlap
+        self.overlap = overlap
+        self._min_version: dict[int, tuple[int, datetime]] = {}
+        self._since: datetime | None = None
+        self._lock = threading.Lock()
+
+    def is_revoked(self, user_id: int, token_version: int) -> bool:
+        entry = self._min_version.get(user_id)
+        return entry is not None and token_version < entry[0]
+
+    def apply(self, user_id: int, token_version: int, revoked_at: datetime | None = None):
+        revoked_at = revoked_at or datetime.now(timezone.utc)
+        with self._lock:
+            current = self._min_version.get(user_id)
+            if current is None or token_version > current[0]:
+                self._min_version[user_id] = (token_version, revoked_at)
+
+    def refresh(self):
+        now = datetime.now(timezone.utc)
+        since = self._since - self.overlap if self._since else now - self.token_lifetime
+
+        with Session(engine) as session:
+            query = select(TokenRevocation).where(TokenRevocation.created_at >= since)
+            revocations = session.exec(query).all()
+
+        for revocation in revocations:
+            self.apply(revocation.user_id, revocation.token_version, revocation.created_at)
+
+        cutoff = now - self.token_lifetime
+        with self._lock:
+            self._min_version = {
+                user_id: entry for user_id, entry in self._min_version.items()
+                if entry[1] >= cutoff
+            }
+        self._since = now
+
+    def prune(self):
+        # the database side of the same retention rule
+        cutoff = datetime.now(timezone.utc) - self.token_lifetime
+        with Session(engine) as session:
+            session.exec(delete(TokenRevocation).where(TokenRevocation.created_at < cutoff))
+            session.commit()
+
+
+class PasswordHashPool:
+    """
+    Runs bcrypt on a few dedicated threads (bcrypt releases the GIL) so a burst of
+    logins can't take every worker thread or the event loop. At most `workers`
+    hashes run at once; a request that can't start within `queue_timeout`, or
+    finds `max_queue` requests already waiting, gets a 503.
+    """
+
+    def __init__(self, workers: int, max_queue: int, queue_timeout: float):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._outstanding = 0
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args) -> Future:
+        with self._lock:
+            if self._outstanding >= self.workers + self.max_queue:
+                raise self._busy()
+            self._outstanding += 1
+
+        deadline = time.monotonic() + self.queue_timeout
+
+        def run():
+            try:
+                if time.monotonic() > deadline:
+                    raise self._busy()
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self._outstanding -= 1
+
+        return self._executor.submit(run)
+
+    def run(self, fn, *args):
+        return self.submit(fn, *args).result()
+
+    async def run_async(self, fn, *args):
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def _busy(self):
+        return HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                             detail="Too many password checks in progress, try again shortly",
+                             headers={"Retry-After": "1"})
+
+
+password_pool = PasswordHashPool(workers=settings.PASSWORD_HASH_WORKERS,
+                                 max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+                                 queue_timeout=settings.PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS)
+revocations = RevocationTable(token_lifetime=timedelta(minutes=settings.TOKEN_EXPIRATION_MINUTES))
@@ -0,0 +1,10 @@
+from sqlalchemy.exc import IntegrityError
+
+FOREIGN_KEY_VIOLATION = "23503"
+
+
+def is_foreign_key_violation(error: IntegrityError) -> bool:
+    # psycopg2 calls it pgcode, asyncpg sqlstate
+    orig = error.orig
+    code = getattr(orig, "sqlstate", None) or getattr(orig, "pgcode", None)
+    return code == FOREIGN_KEY_VIOLATION
@@ -0,0 +1,84 @@
+import threading
+import time
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+
+class PoolStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.timeouts = 0
+        self.overflow_events = 0
+
+    def record(self, waited: bool, overflowed: bool, elapsed: float, timed_out: bool = False):
+        with self._lock:
+            if not timed_out:
+                self.checkouts += 1
+            if timed_out:
+                self.timeouts += 1
+            if overflowed:
+                self.overflow_events += 1
+            if waited:
+                self.waits += 1
+                self.wait_time += elapsed
+                self.max_wait_time = max(self.max_wait_time, elapsed)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "wait_time_seconds": round(self.wait_time, 6),
+                "max_wait_seconds": round(self.max_wait_time, 6),
+                "timeouts": self.timeouts,
+                "overflow_events": self.overflow_events,
+            }
+
+
+class InstrumentedPoolMixin:
+    """
+    Counts how often a checkout had to wait for a connection, for how long,
+    and how often the pool went past pool_size into overflow connections.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        # same decision QueuePool makes: no idle connection and no overflow left means waiting
+        no_idle = self.checkedin() == 0
+        overflow_left = self._max_overflow == -1 or self.overflow() < self._max_overflow
+        waited = no_idle and not overflow_left
+        overflowed = no_idle and overflow_left and self.overflow() >= 0
+
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.stats.record(waited=True, overflowed=False, elapsed=time.perf_counter() - start, timed_out=True)
+            raise
+        self.stats.record(waited=waited, overflowed=overflowed, elapsed=time.perf_counter() - start)
+        return connection
+
+    def status_dict(self) -> dict:
+        return {
+            "pool_size": self.size(),
+            "checked_out": self.checkedout(),
+            "checked_in": self.checkedin(),
+            "overflow": max(self.overflow(), 0),
+            "max_overflow": self._max_overflow,
+            **self.stats.snapshot(),
+        }
+
+
+class InstrumentedQueuePool(InstrumentedPoolMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
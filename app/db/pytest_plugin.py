@@ -0,0 +1,36 @@
+"""
+Query count assertions for tests. Enable it in a conftest.py:
+
+    pytest_plugins = ["app.db.pytest_plugin"]
+
+and wrap the requests of a test:
+
+    def test_get_post(client, assert_max_queries):
+        with assert_max_queries(1):
+            client.get("/posts/1")
+
+Statements are captured from every thread, so it works with TestClient (which runs the
+app in a thread of its own), but also counts anything running in the background meanwhile.
+"""
+from contextlib import contextmanager
+import pytest
+from ..core.config import settings
+from .queries import capture_queries
+
+
+@pytest.fixture
+def assert_max_queries():
+    @contextmanager
+    def check(max_queries: int, max_repeats: int | None = settings.QUERY_REPEAT_THRESHOLD):
+        with capture_queries() as capture:
+            yield capture
+
+        statements = "\n".join(f"  {' '.join(statement.split())}" for statement in capture.statements)
+        assert capture.count <= max_queries, (
+            f"{capture.count} queries, expected at most {max_queries}:\n{statements}"
+        )
+        if max_repeats is not None:
+            repeated = capture.repeated(max_repeats)
+            assert not repeated, f"statements repeated more than {max_repeats} times (N+1?): {repeated}"
+
+    return check
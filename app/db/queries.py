@@ -0,0 +1,138 @@
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+from ..core.config import settings
+from .session import engine, async_engine, replica_engines, async_replica_engines
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+class QueryTracker:
+    """
+    The SQL statements of one request: how many, how long they took, and how often each
+    one ran. The same statement text over and over (a lazy `Relationship` loaded row by
+    row, a query in a loop) is the N+1 pattern, flagged past `max_repeats` runs.
+    """
+
+    def __init__(self, max_queries: int | None = None, max_repeats: int | None = None):
+        self.max_queries = max_queries
+        self.max_repeats = max_repeats
+        self.route = None
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = Counter()
+
+    def record(self, statement: str, elapsed: float):
+        self.count += 1
+        self.seconds += elapsed
+        self.statements[statement] += 1
+        if settings.QUERY_BUDGET_MODE == "raise":
+            # fail inside the offending request, the test or the client sees a 500
+            problems = self.problems()
+            if problems:
+                raise QueryBudgetExceeded("; ".join(problems))
+
+    def repeated(self) -> list[tuple[str, int]]:
+        if self.max_repeats is None:
+            return []
+        return [(statement, runs) for statement, runs in self.statements.most_common() if runs > self.max_repeats]
+
+    def problems(self) -> list[str]:
+        problems = []
+        if self.max_queries is not None and self.count > self.max_queries:
+            problems.append(f"{self.count} queries, the budget is {self.max_queries}")
+        for statement, runs in self.repeated():
+            problems.append(f"same statement {runs} times (N+1?): {' '.join(statement.split())[:200]}")
+        return problems
+
+    def report(self):
+        if settings.QUERY_BUDGET_MODE != "warn":
+            return
+        for problem in self.problems():
+            logger.warning("%s: %s", self.route or "request", problem)
+
+
+# the tracker of the request being handled. Sync routes run in a thread with a copy of the
+# context and async sessions run in a greenlet that shares it, both see the same object
+current_tracker: ContextVar[QueryTracker | None] = ContextVar("current_tracker", default=None)
+
+# called with (statement, seconds) after every statement, requests or not
+observers = []
+
+
+@contextmanager
+def track_queries():
+    tracker = QueryTracker(max_repeats=settings.QUERY_REPEAT_THRESHOLD)
+    token = current_tracker.set(tracker)
+    try:
+        yield tracker
+    finally:
+        current_tracker.reset(token)
+        tracker.report()
+
+
+def query_budget(max_queries: int | None, max_repeats: int | None = settings.QUERY_REPEAT_THRESHOLD):
+    # a route dependency: dependencies=[Depends(query_budget(2))]. max_repeats=None is for
+    # routes that run the same statement on purpose, like chunked imports
+    async def declare():
+        tracker = current_tracker.get()
+        if tracker is not None:
+            tracker.max_queries = max_queries
+            tracker.max_repeats = max_repeats
+    return declare
+
+
+class QueryCapture:
+    """Every statement, from any thread, while capture_queries() is open. For tests."""
+
+    def __init__(self):
+        self.statements = []
+        self._lock = threading.Lock()
+
+    def __call__(self, statement: str, elapsed: float):
+        with self._lock:
+            self.statements.append(statement)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def repeated(self, threshold: int) -> dict[str, int]:
+        return {statement: runs for statement, runs in Counter(self.statements).items() if runs > threshold}
+
+
+@contextmanager
+def capture_queries():
+    capture = QueryCapture()
+    observers.append(capture)
+    try:
+        yield capture
+    finally:
+        observers.remove(capture)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_started
+    for observer in observers:
+        observer(statement, elapsed)
+    tracker = current_tracker.get()
+    if tracker is not None:
+        tracker.record(statement, elapsed)
+
+
+for target in (engine, async_engine.sync_engine, *replica_engines,
+               *(replica.sync_engine for replica in async_replica_engines)):
+    event.listen(target, "before_cursor_execute", before_cursor_execute)
+    event.listen(target, "after_cursor_execute", after_cursor_execute)
@@ -0,0 +1,112 @@
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from sqlalchemy.exc import DBAPIError
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from ..core.config import settings
+from .session import engine, async_engine, replica_engines, async_replica_engines
+
+logger = logging.getLogger(__name__)
+
+# what a replica that is down or unreachable raises on connect
+CONNECT_ERRORS = (DBAPIError, OSError, asyncio.TimeoutError)
+
+
+class ReplicaSet:
+    """
+    Picks the engine a read-only session runs on. Reads are spread round robin over the
+    replicas that are up. A replica that fails to connect is skipped for
+    REPLICA_RETRY_SECONDS, and with no replica left reads go to the primary.
+
+    Replicas lag behind the primary, so a user who just wrote something could read the old
+    version. For READ_YOUR_WRITES_SECONDS after a write their reads go to the primary.
+    The writes are remembered per worker: a read served by another worker isn't pinned.
+    """
+
+    def __init__(self, replicas: list, async_replicas: list, pin_seconds: float, retry_seconds: float):
+        self.replicas = replicas
+        self.async_replicas = async_replicas
+        self.pin_seconds = pin_seconds
+        self.retry_seconds = retry_seconds
+        self._next = itertools.count()
+        self._down_until = [0.0] * len(replicas)
+        self._pinned_until: dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def pin(self, user_id: int):
+        if not self.replicas or self.pin_seconds <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._pinned_until[user_id] = now + self.pin_seconds
+            if len(self._pinned_until) > 10_000:
+                # drop the expired ones now and then, the dict only holds recent writers
+                self._pinned_until = {user: until for user, until in self._pinned_until.items() if until > now}
+
+    def is_pinned(self, user_id: int | None) -> bool:
+        if user_id is None:
+            return False
+        return self._pinned_until.get(user_id, 0.0) > time.monotonic()
+
+    def candidates(self, user_id: int | None) -> list[int]:
+        # indexes of the replicas to try, in order. Empty means the primary
+        if self.is_pinned(user_id):
+            return []
+        now = time.monotonic()
+        start = next(self._next)
+        order = [(start + i) % len(self.replicas) for i in range(len(self.replicas))]
+        return [index for index in order if self._down_until[index] <= now]
+
+    def mark_down(self, index: int, error: Exception):
+        logger.warning("replica %d is unreachable, reading from the others for %ds: %s",
+                       index, self.retry_seconds, error)
+        self._down_until[index] = time.monotonic() + self.retry_seconds
+
+    @contextmanager
+    def read_session(self, user_id: int | None = None):
+        for index in self.candidates(user_id):
+            session = Session(self.replicas[index])
+            try:
+                # connect now, so a replica that is down can still be swapped for another one
+                session.connection()
+            except CONNECT_ERRORS as e:
+                session.close()
+                self.mark_down(index, e)
+                continue
+            with session:
+                yield session
+            return
+
+        with Session(engine) as session:
+            yield session
+
+    @asynccontextmanager
+    async def async_read_session(self, user_id: int | None = None):
+        for index in self.candidates(user_id):
+            session = AsyncSession(self.async_replicas[index], expire_on_commit=False)
+            try:
+                await session.connection()
+            except CONNECT_ERRORS as e:
+                await session.close()
+                self.mark_down(index, e)
+                continue
+            async with session:
+                yield session
+            return
+
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            yield session
+
+    async def dispose(self):
+        for replica in self.replicas:
+            replica.dispose()
+        for replica in self.async_replicas:
+            await replica.dispose()
+
+
+replicas = ReplicaSet(replica_engines, async_replica_engines,
+                      settings.READ_YOUR_WRITES_SECONDS, settings.REPLICA_RETRY_SECONDS)
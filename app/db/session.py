@@ -1,12 +1,64 @@
 from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
 from ..core.config import settings
+from .pool import InstrumentedQueuePool, InstrumentedAsyncQueuePool
+
+# every worker process holds up to 2 * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections,
+# one pool per engine. Keep workers * that below max_connections on the server.
+POOL_OPTIONS = {
+    "pool_size": settings.DB_POOL_SIZE,
+    "max_overflow": settings.DB_MAX_OVERFLOW,
+    "pool_timeout": settings.DB_POOL_TIMEOUT,
+    "pool_recycle": settings.DB_POOL_RECYCLE,
+    "pool_pre_ping": settings.DB_POOL_PRE_PING,
+}
 
 DATABASE_URL = settings.DATABASE_URL
-engine = create_engine(DATABASE_URL, echo=True)
+engine = create_engine(DATABASE_URL, echo=settings.DB_ECHO, poolclass=InstrumentedQueuePool, **POOL_OPTIONS)
+
+# async def routes use this one, so waiting on the database doesn't block the event loop
+ASYNC_DATABASE_URL = settings.ASYNC_DATABASE_URL
+async_engine = create_async_engine(ASYNC_DATABASE_URL, echo=settings.DB_ECHO,
+                                   poolclass=InstrumentedAsyncQueuePool, **POOL_OPTIONS)
+
+# read replicas (see replicas.py), each with its own pair of pools. Connecting gives up
+# quickly so a replica that is down costs a request REPLICA_CONNECT_TIMEOUT_SECONDS, not a minute
+REPLICA_URLS = [make_url(url.strip()) for url in settings.REPLICA_URLS.split(",") if url.strip()]
+replica_engines = [
+    create_engine(url, echo=settings.DB_ECHO, poolclass=InstrumentedQueuePool,
+                  connect_args={"connect_timeout": settings.REPLICA_CONNECT_TIMEOUT_SECONDS}, **POOL_OPTIONS)
+    for url in REPLICA_URLS
+]
+async_replica_engines = [
+    create_async_engine(url.set(drivername="postgresql+asyncpg"), echo=settings.DB_ECHO,
+                        poolclass=InstrumentedAsyncQueuePool,
+                        connect_args={"timeout": settings.REPLICA_CONNECT_TIMEOUT_SECONDS}, **POOL_OPTIONS)
+    for url in REPLICA_URLS
+]
 
 def init_db():
     SQLModel.metadata.create_all(engine)
 
 def get_session():
     with Session(engine) as session:
-        yield session
\ No newline at end of file
+        yield session
+
+async def get_async_session():
+    # objects are used after commit in the routes, and lazy refreshes can't happen in async code
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+
+def pool_stats():
+    return {
+        "sync": engine.pool.status_dict(),
+        "async": async_engine.pool.status_dict(),
+        "replicas": {
+            f"{url.host}:{url.port or 5432}/{url.database}": {
+                "sync": sync.pool.status_dict(),
+                "async": async_.pool.status_dict(),
+            }
+            for url, sync, async_ in zip(REPLICA_URLS, replica_engines, async_replica_engines)
+        },
+    }
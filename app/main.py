@@ -1,30 +1,78 @@
 from fastapi import FastAPI
-from .db.session import init_db
+from fastapi.responses import PlainTextResponse
+from .db.session import init_db, async_engine, pool_stats
+from .db.replicas import replicas
 from contextlib import asynccontextmanager
-from .api import users, auth, posts, analytics
+from .api import users, auth, posts, analytics, feed, comments
 from apscheduler.schedulers.background import BackgroundScheduler
-from .core.scheduler import publish_scheduled_posts
+from .core.schedule_queue import schedule_queue, scheduler_leader
+from .core.leader import leader_only
+from .core.impressions import impression_buffer
+from .core.config import settings
+from .core.security import revocations
+from .core.leaderboard import leaderboard
+from .core.rollups import aggregate_reactions
+from .core.serialization import OrjsonResponse
+from .core.search import search_index
+from .core.feed import trim_feeds
+from .core.metrics import MetricsMiddleware, registry, timed_job
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     init_db()
+    revocations.refresh()
+    leaderboard.refresh()
+    search_index.load()
+    # every worker competes for the scheduler, only the leader runs its jobs
+    scheduler_leader.start()
 
     scheduler = BackgroundScheduler()
-    scheduler.add_job(publish_scheduled_posts, "interval", minutes=1)
+    # the queue publishes on time, this slow poll only catches what it missed.
+    # Both go through publish_scheduled_posts, which is timed on its own
+    scheduler.add_job(leader_only(scheduler_leader, schedule_queue.reconcile), "interval",
+                      seconds=settings.SCHEDULER_RECONCILE_SECONDS)
+    scheduler.add_job(timed_job(impression_buffer.flush), "interval",
+                      seconds=settings.IMPRESSION_FLUSH_INTERVAL_SECONDS)
+    scheduler.add_job(timed_job(leaderboard.refresh), "interval", seconds=settings.LEADERBOARD_REFRESH_SECONDS)
+    scheduler.add_job(timed_job(revocations.refresh), "interval", seconds=settings.TOKEN_REVOCATION_REFRESH_SECONDS)
+    scheduler.add_job(leader_only(scheduler_leader, timed_job(revocations.prune)), "interval", hours=1)
+    scheduler.add_job(leader_only(scheduler_leader, timed_job(aggregate_reactions)), "interval",
+                      seconds=settings.ROLLUP_INTERVAL_SECONDS)
+    scheduler.add_job(leader_only(scheduler_leader, timed_job(trim_feeds)), "interval",
+                      seconds=settings.FEED_TRIM_SECONDS)
     scheduler.start()
     yield
     scheduler.shutdown()
+    scheduler_leader.stop()
+    impression_buffer.flush()
+    await async_engine.dispose()
+    await replicas.dispose()
 
 app = FastAPI(title="LinkedIn Analytics API", 
               description="A backend API for LinkedIn",
+              default_response_class=OrjsonResponse,
               lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(auth.router)
 app.include_router(users.router)
 app.include_router(posts.router)
 app.include_router(analytics.router)
+app.include_router(feed.router)
+app.include_router(comments.router)
 
 
 @app.get("/")
 def home():
-    return {"msg": "Yo, what's up?"}
\ No newline at end of file
+    return {"msg": "Yo, what's up?"}
+
+
+@app.get("/health/db-pool")
+def db_pool():
+    return pool_stats()
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    # Prometheus text format, this worker's numbers only
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,32 @@
+"""add post pagination indexes
+
+Revision ID: 13f59f3993e8
+Revises: 4aec820c5d4e
+Create Date: 2026-10-18 11:21:40.902113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '13f59f3993e8'
+down_revision: Union[str, Sequence[str], None] = '4aec820c5d4e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_posts_created_at_id', 'posts', ['created_at', 'id'], unique=False)
+    op.create_index('ix_posts_user_id_created_at_id', 'posts', ['user_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_posts_status_created_at_id', 'posts', ['status', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_posts_status_created_at_id', table_name='posts')
+    op.drop_index('ix_posts_user_id_created_at_id', table_name='posts')
+    op.drop_index('ix_posts_created_at_id', table_name='posts')
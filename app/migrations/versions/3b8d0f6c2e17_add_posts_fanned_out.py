@@ -0,0 +1,37 @@
+"""add posts.fanned_out
+
+Revision ID: 3b8d0f6c2e17
+Revises: 5e631555ed29
+Create Date: 2026-10-18 21:12:40.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from app.core.config import settings
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b8d0f6c2e17'
+down_revision: Union[str, Sequence[str], None] = '5e631555ed29'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('posts', sa.Column('fanned_out', sa.Boolean(), server_default=sa.false(), nullable=False))
+    # feed reads used to decide by the author's follower count, same answer for the existing posts
+    op.execute(sa.text(
+        "UPDATE posts SET fanned_out = true FROM users "
+        "WHERE users.id = posts.user_id AND posts.status = 'PUBLISHED' AND users.follower_count < :threshold"
+    ).bindparams(threshold=settings.FEED_FANOUT_MAX_FOLLOWERS))
+    op.create_index('ix_posts_not_fanned_out', 'posts', ['user_id', 'published_at', 'id'], unique=False,
+                    postgresql_where=sa.text('NOT fanned_out'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_posts_not_fanned_out', table_name='posts', postgresql_where=sa.text('NOT fanned_out'))
+    op.drop_column('posts', 'fanned_out')
@@ -0,0 +1,39 @@
+"""add post_reaction_counts table
+
+Revision ID: 4aec820c5d4e
+Revises: c1994761d21a
+Create Date: 2026-10-18 10:04:12.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '4aec820c5d4e'
+down_revision: Union[str, Sequence[str], None] = 'c1994761d21a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('post_reaction_counts',
+    sa.Column('post_id', sa.Integer(), nullable=False),
+    sa.Column('type', postgresql.ENUM('LIKE', 'CELEBRATE', 'SUPPORT', 'LOVE', 'INSIGHTFUL', 'FUNNY', name='reactiontype', create_type=False), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['post_id'], ['posts.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('post_id', 'type')
+    )
+    # backfill from the existing reactions
+    op.execute("""
+        INSERT INTO post_reaction_counts (post_id, type, count)
+        SELECT post_id, type, COUNT(*) FROM reactions GROUP BY post_id, type
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('post_reaction_counts')
@@ -0,0 +1,34 @@
+"""add post_reach_sketches table
+
+Revision ID: 5e631555ed29
+Revises: d6a08979f051
+Create Date: 2026-10-18 20:04:48.129553
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e631555ed29'
+down_revision: Union[str, Sequence[str], None] = 'd6a08979f051'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('post_reach_sketches',
+    sa.Column('post_id', sa.Integer(), nullable=False),
+    sa.Column('bucket_start', sa.DateTime(), nullable=False),
+    sa.Column('sketch', sa.LargeBinary(), nullable=False),
+    sa.ForeignKeyConstraint(['post_id'], ['posts.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('post_id', 'bucket_start')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('post_reach_sketches')
@@ -0,0 +1,35 @@
+"""add posts search_vector and its GIN index
+
+Revision ID: 8fac998fa5c1
+Revises: ade2151bc1f1
+Create Date: 2026-10-18 18:12:40.275310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8fac998fa5c1'
+down_revision: Union[str, Sequence[str], None] = 'ade2151bc1f1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # generated column, filled in for the existing rows by the ALTER itself
+    op.execute(
+        "ALTER TABLE posts ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('english', title), 'A') || setweight(to_tsvector('english', body), 'B')"
+        ") STORED"
+    )
+    op.create_index('ix_posts_search_vector', 'posts', ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_posts_search_vector', table_name='posts')
+    op.drop_column('posts', 'search_vector')
@@ -0,0 +1,56 @@
+"""add follows, feed_entries, users.follower_count and posts.published_at
+
+Revision ID: 9c22e851927d
+Revises: 8fac998fa5c1
+Create Date: 2026-10-18 18:55:21.604318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c22e851927d'
+down_revision: Union[str, Sequence[str], None] = '8fac998fa5c1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('follower_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('posts', sa.Column('published_at', sa.DateTime(), nullable=True))
+    # best guess for the posts that went live before the column existed
+    op.execute("UPDATE posts SET published_at = COALESCE(scheduled_at, created_at) WHERE status = 'PUBLISHED'")
+    op.create_index('ix_posts_user_id_published_at_id', 'posts', ['user_id', 'published_at', 'id'], unique=False)
+
+    op.create_table('follows',
+    sa.Column('follower_id', sa.Integer(), nullable=False),
+    sa.Column('followee_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['followee_id'], ['users.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['follower_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('follower_id', 'followee_id')
+    )
+    op.create_index('ix_follows_followee_id_follower_id', 'follows', ['followee_id', 'follower_id'], unique=False)
+    op.create_table('feed_entries',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('published_at', sa.DateTime(), nullable=False),
+    sa.Column('post_id', sa.Integer(), nullable=False),
+    sa.Column('author_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['post_id'], ['posts.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'published_at', 'post_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('feed_entries')
+    op.drop_index('ix_follows_followee_id_follower_id', table_name='follows')
+    op.drop_table('follows')
+    op.drop_index('ix_posts_user_id_published_at_id', table_name='posts')
+    op.drop_column('posts', 'published_at')
+    op.drop_column('users', 'follower_count')
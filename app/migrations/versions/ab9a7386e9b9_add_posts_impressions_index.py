@@ -0,0 +1,28 @@
+"""add posts impressions index
+
+Revision ID: ab9a7386e9b9
+Revises: edcb6e1517e6
+Create Date: 2026-10-18 15:47:09.114262
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ab9a7386e9b9'
+down_revision: Union[str, Sequence[str], None] = 'edcb6e1517e6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_posts_impressions', 'posts', ['impressions'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_posts_impressions', table_name='posts')
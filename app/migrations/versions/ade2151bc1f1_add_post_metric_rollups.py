@@ -0,0 +1,51 @@
+"""add post_metric_rollups and rollup_watermarks tables
+
+Revision ID: ade2151bc1f1
+Revises: ab9a7386e9b9
+Create Date: 2026-10-18 16:30:55.402117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'ade2151bc1f1'
+down_revision: Union[str, Sequence[str], None] = 'ab9a7386e9b9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    metrictype = postgresql.ENUM('ENGAGEMENT', 'IMPRESSION', name='metrictype')
+    granularity = postgresql.ENUM('HOUR', 'DAY', name='granularity')
+    metrictype.create(op.get_bind(), checkfirst=True)
+    granularity.create(op.get_bind(), checkfirst=True)
+
+    op.create_table('post_metric_rollups',
+    sa.Column('post_id', sa.Integer(), nullable=False),
+    sa.Column('metric', postgresql.ENUM(name='metrictype', create_type=False), nullable=False),
+    sa.Column('granularity', postgresql.ENUM(name='granularity', create_type=False), nullable=False),
+    sa.Column('bucket_start', sa.DateTime(), nullable=False),
+    sa.Column('value', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['post_id'], ['posts.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('post_id', 'metric', 'granularity', 'bucket_start')
+    )
+    op.create_table('rollup_watermarks',
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('value', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.create_index('ix_reactions_created_at', 'reactions', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_reactions_created_at', table_name='reactions')
+    op.drop_table('rollup_watermarks')
+    op.drop_table('post_metric_rollups')
+    postgresql.ENUM(name='granularity').drop(op.get_bind(), checkfirst=True)
+    postgresql.ENUM(name='metrictype').drop(op.get_bind(), checkfirst=True)
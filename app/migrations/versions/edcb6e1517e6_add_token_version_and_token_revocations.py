@@ -0,0 +1,40 @@
+"""add token_version to users and token_revocations table
+
+Revision ID: edcb6e1517e6
+Revises: 13f59f3993e8
+Create Date: 2026-10-18 13:02:51.550871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'edcb6e1517e6'
+down_revision: Union[str, Sequence[str], None] = '13f59f3993e8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+    op.create_table('token_revocations',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('token_version', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_token_revocations_user_id'), 'token_revocations', ['user_id'], unique=False)
+    op.create_index(op.f('ix_token_revocations_created_at'), 'token_revocations', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_token_revocations_created_at'), table_name='token_revocations')
+    op.drop_index(op.f('ix_token_revocations_user_id'), table_name='token_revocations')
+    op.drop_table('token_revocations')
+    op.drop_column('users', 'token_version')
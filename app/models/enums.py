@@ -22,4 +22,14 @@ class ReactionType(str, Enum):
 
 class MetricType(str, Enum):
     ENGAGEMENT = "engagement"
-    IMPRESSION = "impression"
\ No newline at end of file
+    IMPRESSION = "impression"
+
+
+class Granularity(str, Enum):
+    HOUR = "hour"
+    DAY = "day"
+
+
+class ExportFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
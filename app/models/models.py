@@ -1,7 +1,9 @@
-from sqlmodel import SQLModel, Field, Relationship, UniqueConstraint
+from sqlmodel import SQLModel, Field, Relationship, UniqueConstraint, Index
+from sqlalchemy import DDL, LargeBinary, event, text
 from datetime import datetime, timezone
-from .enums import Role, Status, ReactionType
+from .enums import Role, Status, ReactionType, MetricType, Granularity
 from functools import partial
+from .types import UtcDateTime
 
 class User(SQLModel, table=True):
     __tablename__ = "users"
@@ -11,7 +13,11 @@ class User(SQLModel, table=True):
     lastname: str = Field(max_length=32, min_length=1, nullable=False)
     password: str = Field(max_length=128, min_length=12, nullable=False)
     role: Role = Field(default=Role.USER, nullable=False)
-    created_at: datetime = Field(default_factory=partial(datetime.now, timezone.utc))
+    # bumped whenever the tokens issued so far should stop working
+    token_version: int = Field(default=0, nullable=False)
+    # kept up to date by follow/unfollow, decides fan-out on write vs on read for the feed
+    follower_count: int = Field(default=0, nullable=False)
+    created_at: datetime = Field(default_factory=partial(datetime.now, timezone.utc), sa_type=UtcDateTime)
 
     posts: list["Post"] = Relationship(back_populates="user")  # plural for one-to-many
     reactions: list["Reaction"] = Relationship(back_populates="user")
@@ -19,28 +25,147 @@ class User(SQLModel, table=True):
 
 class Post(SQLModel, table=True):
     __tablename__ = "posts"
+    # (created_at, id) is the sort key of the paginated post lists
+    __table_args__ = (
+        Index("ix_posts_created_at_id", "created_at", "id"),
+        Index("ix_posts_user_id_created_at_id", "user_id", "created_at", "id"),
+        Index("ix_posts_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_posts_impressions", "impressions"),
+        # feed backfills, and reads of the posts that were not fanned out
+        Index("ix_posts_user_id_published_at_id", "user_id", "published_at", "id"),
+        Index("ix_posts_not_fanned_out", "user_id", "published_at", "id",
+              postgresql_where=text("NOT fanned_out")),
+    )
+
     id: int | None = Field(default=None, primary_key=True)
     user_id: int | None = Field(foreign_key="users.id", ondelete="CASCADE")
     title: str = Field(max_length=100, min_length=16, nullable=False)
     body: str = Field(min_length=100, nullable=False)
     status: Status = Field(default=Status.PUBLISHED, nullable=False)
-    scheduled_at: datetime | None = Field(default=None, nullable=True)
+    scheduled_at: datetime | None = Field(default=None, nullable=True, sa_type=UtcDateTime)
+    # set when the post goes live, the feed is ordered by it
+    published_at: datetime | None = Field(default=None, nullable=True, sa_type=UtcDateTime)
+    # whether it went into the followers' timelines when it went live, see core/feed.py
+    fanned_out: bool = Field(default=False, nullable=False)
     impressions: int = Field(default=0)
-    created_at: datetime = Field(default_factory=partial(datetime.now, timezone.utc))
+    # comments and replies, moved with every comment write so analytics doesn't count them
+    comment_count: int = Field(default=0, nullable=False)
+    created_at: datetime = Field(default_factory=partial(datetime.now, timezone.utc), sa_type=UtcDateTime)
 
     user: User = Relationship(back_populates="posts")  # singular for many-to-one
     reactions: list["Reaction"] = Relationship(back_populates="post")
 
 
+# Full-text search (Postgres only): a generated tsvector over title and body, with a GIN
+# index. It isn't mapped so `select(Post)` doesn't load it, search refers to it by name.
+SEARCH_VECTOR = "search_vector"
+SEARCH_VECTOR_EXPRESSION = (
+    "setweight(to_tsvector('english', title), 'A') || setweight(to_tsvector('english', body), 'B')"
+)
+event.listen(Post.__table__, "after_create", DDL(
+    f"ALTER TABLE posts ADD COLUMN {SEARCH_VECTOR} tsvector GENERATED ALWAYS AS ({SEARCH_VECTOR_EXPRESSION}) STORED"
+).execute_if(dialect="postgresql"))
+event.listen(Post.__table__, "after_create", DDL(
+    f"CREATE INDEX ix_posts_search_vector ON posts USING gin ({SEARCH_VECTOR})"
+).execute_if(dialect="postgresql"))
+
+
 class Reaction(SQLModel, table=True):
     __tablename__ = "reactions"
-    __table_args__ = (UniqueConstraint("post_id", "user_id", name="uq_post_user_reaction"),)
+    __table_args__ = (
+        UniqueConstraint("post_id", "user_id", name="uq_post_user_reaction"),
+        Index("ix_reactions_created_at", "created_at"),
+    )
 
     id: int | None = Field(default=None, primary_key=True)
     post_id: int | None = Field(foreign_key="posts.id", nullable=False)
     user_id: int | None = Field(foreign_key="users.id", ondelete="CASCADE")
     type: ReactionType = Field(nullable=False)
-    created_at: datetime = Field(default_factory=partial(datetime.now, timezone.utc))
+    created_at: datetime = Field(default_factory=partial(datetime.now, timezone.utc), sa_type=UtcDateTime)
 
     post: Post = Relationship(back_populates="reactions")
-    user: User = Relationship(back_populates="reactions")
\ No newline at end of file
+    user: User = Relationship(back_populates="reactions")
+
+
+class PostReactionCount(SQLModel, table=True):
+    __tablename__ = "post_reaction_counts"
+
+    post_id: int = Field(foreign_key="posts.id", primary_key=True, ondelete="CASCADE")
+    type: ReactionType = Field(primary_key=True)
+    count: int = Field(default=0, nullable=False)
+
+
+class TokenRevocation(SQLModel, table=True):
+    __tablename__ = "token_revocations"
+
+    # no foreign key, the rows have to outlive deleted users
+    id: int | None = Field(default=None, primary_key=True)
+    user_id: int = Field(index=True, nullable=False)
+    token_version: int = Field(nullable=False)  # tokens with a lower version are rejected
+    created_at: datetime = Field(default_factory=partial(datetime.now, timezone.utc), index=True, sa_type=UtcDateTime)
+
+
+class PostMetricRollup(SQLModel, table=True):
+    __tablename__ = "post_metric_rollups"
+
+    # one row per post, metric and hour/day bucket, the primary key is the range scan of a series
+    post_id: int = Field(foreign_key="posts.id", primary_key=True, ondelete="CASCADE")
+    metric: MetricType = Field(primary_key=True)
+    granularity: Granularity = Field(primary_key=True)
+    bucket_start: datetime = Field(primary_key=True, sa_type=UtcDateTime)
+    value: int = Field(default=0, nullable=False)
+
+
+class PostReachSketch(SQLModel, table=True):
+    __tablename__ = "post_reach_sketches"
+
+    # HyperLogLog of the post's viewers, one row per day plus an all-time row (see core/reach.py)
+    post_id: int = Field(foreign_key="posts.id", primary_key=True, ondelete="CASCADE")
+    bucket_start: datetime = Field(primary_key=True, sa_type=UtcDateTime)
+    sketch: bytes = Field(sa_type=LargeBinary, nullable=False)
+
+
+class RollupWatermark(SQLModel, table=True):
+    __tablename__ = "rollup_watermarks"
+
+    # everything up to `value` has been aggregated by the job called `name`
+    name: str = Field(primary_key=True, max_length=64)
+    value: datetime = Field(nullable=False, sa_type=UtcDateTime)
+
+
+class Follow(SQLModel, table=True):
+    __tablename__ = "follows"
+    # the primary key serves "who do I follow", the index "who follows this author" (fan-out)
+    __table_args__ = (
+        Index("ix_follows_followee_id_follower_id", "followee_id", "follower_id"),
+    )
+
+    follower_id: int = Field(foreign_key="users.id", primary_key=True, ondelete="CASCADE")
+    followee_id: int = Field(foreign_key="users.id", primary_key=True, ondelete="CASCADE")
+    created_at: datetime = Field(default_factory=partial(datetime.now, timezone.utc), sa_type=UtcDateTime)
+
+
+class FeedEntry(SQLModel, table=True):
+    __tablename__ = "feed_entries"
+
+    # a user's home timeline, newest first is a range scan of the primary key
+    user_id: int = Field(foreign_key="users.id", primary_key=True, ondelete="CASCADE")
+    published_at: datetime = Field(primary_key=True, sa_type=UtcDateTime)
+    post_id: int = Field(foreign_key="posts.id", primary_key=True, ondelete="CASCADE")
+    author_id: int = Field(nullable=False)
+
+
+class Comment(SQLModel, table=True):
+    __tablename__ = "comments"
+    # one level of a thread (top level: parent_id IS NULL), oldest first, is a range scan of this
+    __table_args__ = (
+        Index("ix_comments_post_id_parent_id_created_at_id", "post_id", "parent_id", "created_at", "id"),
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
+    post_id: int = Field(foreign_key="posts.id", nullable=False, ondelete="CASCADE")
+    user_id: int = Field(foreign_key="users.id", nullable=False, ondelete="CASCADE")
+    parent_id: int | None = Field(default=None, foreign_key="comments.id", nullable=True, ondelete="CASCADE")
+    body: str = Field(max_length=3000, min_length=1, nullable=False)
+    reply_count: int = Field(default=0, nullable=False)
+    created_at: datetime = Field(default_factory=partial(datetime.now, timezone.utc), sa_type=UtcDateTime)
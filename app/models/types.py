@@ -0,0 +1,29 @@
+from datetime import datetime, timezone
+from sqlalchemy import DateTime
+from sqlalchemy.types import TypeDecorator
+
+
+def as_utc(value: datetime) -> datetime:
+    # naive datetimes are taken to be UTC already
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+class UtcDateTime(TypeDecorator):
+    """
+    The timestamp columns are `timestamp without time zone` holding UTC. asyncpg
+    refuses aware datetimes for those, so values are converted to naive UTC on the
+    way in and get their UTC tzinfo back on the way out.
+    """
+
+    impl = DateTime
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return as_utc(value).replace(tzinfo=None)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return value.replace(tzinfo=timezone.utc)
@@ -0,0 +1,15 @@
+from pydantic import BaseModel
+from ..models.enums import MetricType, Granularity
+from datetime import datetime
+
+
+class MetricPoint(BaseModel):
+    bucket: datetime
+    value: int
+
+
+class MetricSeries(BaseModel):
+    post_id: int
+    metric: MetricType
+    granularity: Granularity
+    series: list[MetricPoint]
@@ -0,0 +1,22 @@
+from pydantic import BaseModel, Field
+from datetime import datetime
+
+
+class CommentCreate(BaseModel):
+    body: str = Field(min_length=1, max_length=3000)
+    parent_id: int | None = None
+
+
+class CommentPublic(BaseModel):
+    id: int
+    post_id: int
+    user_id: int
+    parent_id: int | None = None
+    body: str
+    reply_count: int
+    created_at: datetime
+
+
+class CommentPage(BaseModel):
+    items: list[CommentPublic]
+    next_cursor: str | None = None
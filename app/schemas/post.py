@@ -16,6 +16,20 @@ class PostPublic(BaseModel):
     scheduled_at: datetime | None = None
 
 
+class PostPage(BaseModel):
+    items: list[PostPublic]
+    next_cursor: str | None = None
+
+
+class FeedItem(PostPublic):
+    published_at: datetime
+
+
+class FeedPage(BaseModel):
+    items: list[FeedItem]
+    next_cursor: str | None = None
+
+
 class PostCreate(BaseModel):
     title: str
     body: str 
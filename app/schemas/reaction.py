@@ -11,4 +11,23 @@ class ReactionPublic(BaseModel):
     type: ReactionType
     post_id: int
     user_id: int
-    created_at: datetime
\ No newline at end of file
+    created_at: datetime
+
+class BulkReactionBatch(BaseModel):
+    batch: int
+    accepted: int
+    duplicate: int
+    rejected: int
+
+
+class BulkReactionError(BaseModel):
+    item: int
+    reason: str
+
+
+class BulkReactionReport(BaseModel):
+    accepted: int
+    duplicate: int
+    rejected: int
+    batches: list[BulkReactionBatch]
+    errors: list[BulkReactionError]
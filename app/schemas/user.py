@@ -14,6 +14,13 @@ class UserPublic(BaseModel):
     username: str
     role: Role
 
+class TokenUser(BaseModel):
+    # the user as described by the token claims, no database lookup involved
+    id: int
+    username: str
+    role: Role
+    token_version: int
+
 class UserUpdate(BaseModel):
     firstname: str | None = None
     lastname: str | None = None
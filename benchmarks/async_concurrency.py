@@ -0,0 +1,83 @@
+"""
+Compares a blocking Session used from async code (what the async routes did before)
+with the AsyncSession path, under N concurrent requests.
+
+Each simulated request runs one query that holds the connection for --query-ms,
+standing in for a real round trip. With the sync session the event loop is blocked
+during every query, so requests run one after another; with the async session they
+overlap, up to the size of the connection pool.
+
+    python -m benchmarks.async_concurrency --requests 200 --concurrency 20 --query-ms 20
+"""
+import argparse
+import asyncio
+import time
+from sqlmodel import Session, text
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.db.session import engine, async_engine
+
+
+def query_for(delay_ms: int):
+    return text("SELECT pg_sleep(:delay)").bindparams(delay=delay_ms / 1000)
+
+
+async def sync_request(delay_ms: int):
+    # blocking call inside a coroutine, the loop can't do anything else meanwhile
+    with Session(engine) as session:
+        session.exec(query_for(delay_ms)).all()
+
+
+async def async_request(delay_ms: int):
+    async with AsyncSession(async_engine) as session:
+        (await session.exec(query_for(delay_ms))).all()
+
+
+async def run(request, total: int, concurrency: int, delay_ms: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await request(delay_ms)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1),
+        "max_ms": round(latencies[-1] * 1000, 1),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--query-ms", type=int, default=20)
+    args = parser.parse_args()
+
+    # warm up both pools so connection setup isn't measured
+    await run(sync_request, args.concurrency, args.concurrency, 0)
+    await run(async_request, args.concurrency, args.concurrency, 0)
+
+    results = {
+        "sync session": await run(sync_request, args.requests, args.concurrency, args.query_ms),
+        "async session": await run(async_request, args.requests, args.concurrency, args.query_ms),
+    }
+    for name, result in results.items():
+        print(f"{name:>14}: {result}")
+
+    speedup = results["async session"]["throughput_rps"] / results["sync session"]["throughput_rps"]
+    print(f"async speedup: {speedup:.1f}x")
+
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
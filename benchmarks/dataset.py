@@ -0,0 +1,254 @@
+"""
+Deterministic synthetic data for the benchmarks and for scale testing: the same --seed
+and sizes give the same users, posts and reactions. Everything it creates belongs to
+users named `bench...`, and --reset removes only those, so it can share a database with
+other data.
+
+Rows are generated as a stream and loaded with COPY on PostgreSQL (multi-row INSERTs on
+other databases), so millions of users and tens of millions of reactions fit in memory
+and load in minutes:
+
+    python -m benchmarks.dataset --users 500 --posts 5000 --reactions 50000 --seed 42 --reset
+    python -m benchmarks.dataset --users 1000000 --posts 5000000 --reactions 30000000 --reset
+
+Popularity is zipf-like, weight 1 / (rank + 1) ** exponent: --author-exponent skews who
+writes the posts, --popularity-exponent how the reactions spread over the posts (0 is
+uniform). The first user is the one the benchmarks log in as, it owns every 50th post.
+
+Passwords come from a pool of --password-pool bcrypt hashes, user i logs in with
+`password(i % pool)`. Hashing once per user would take longer than the rest of the seed.
+"""
+import argparse
+import csv
+import io
+import random
+import string
+import time
+from array import array
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from itertools import accumulate, islice
+from sqlalchemy import delete, insert, select, text
+from sqlmodel import Session
+from app.db.session import engine, init_db
+from app.models.models import User, Post, Reaction
+from app.models.enums import Role, Status, ReactionType
+from app.api.deps import pwd_context
+from app.core.counters import rebuild_reaction_counts
+
+BENCH_PREFIX = "bench"
+BENCH_USERNAME = f"{BENCH_PREFIX}00000000"
+BENCH_PASSWORD = "benchmark-password"
+# fixed so the same seed gives the same rows on any day
+BASE_TIME = datetime(2025, 1, 1, tzinfo=timezone.utc)
+INSERT_CHUNK = 1000
+COPY_CHUNK = 50_000
+# a post gets its reactions within a week of being published
+REACTION_WINDOW = 7 * 24 * 3600
+
+USER_COLUMNS = ("username", "firstname", "lastname", "password", "role", "token_version",
+                "follower_count", "created_at")
+POST_COLUMNS = ("user_id", "title", "body", "status", "impressions", "comment_count",
+                "created_at", "published_at")
+REACTION_COLUMNS = ("post_id", "user_id", "type", "created_at")
+
+WORDS = (
+    "team launch growth hiring product design data cloud remote career lessons market startup "
+    "leadership customer engineering sales network learning future strategy update milestone"
+).split()
+REACTION_WEIGHTS = {
+    ReactionType.LIKE: 60, ReactionType.CELEBRATE: 12, ReactionType.SUPPORT: 8,
+    ReactionType.LOVE: 8, ReactionType.INSIGHTFUL: 10, ReactionType.FUNNY: 2,
+}
+
+
+class Zipf:
+    """Picks items out of range(n), rank r with weight 1 / (r + 1) ** exponent. The ranks
+    are shuffled onto the items, so the popular ones aren't simply the first ids."""
+
+    def __init__(self, rng: random.Random, n: int, exponent: float):
+        self.ranks = range(n)
+        self.cum_weights = list(accumulate(1 / (rank + 1) ** exponent for rank in self.ranks))
+        self.items = list(self.ranks)
+        rng.shuffle(self.items)
+
+    def sample(self, rng: random.Random, k: int) -> list[int]:
+        return [self.items[rank] for rank in rng.choices(self.ranks, cum_weights=self.cum_weights, k=k)]
+
+
+def password(i: int) -> str:
+    return BENCH_PASSWORD if i == 0 else f"{BENCH_PASSWORD}-{i}"
+
+
+def password_pool(size: int) -> list[str]:
+    return [pwd_context.hash(password(i)) for i in range(size)]
+
+
+def sentence(rng: random.Random, min_length: int, max_length: int | None = None) -> str:
+    text = ""
+    while len(text) < min_length:
+        text += rng.choice(WORDS) + " "
+    text = text.strip().capitalize() + "."
+    return text[:max_length] if max_length else text
+
+
+def name(rng: random.Random) -> str:
+    return "".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 12))).capitalize()
+
+
+def reaction_counts(rng: random.Random, posts: int, users: int, total: int, exponent: float) -> array:
+    # how many reactions each post gets, about `total` in all. A post can't have more than
+    # one per user (uq_post_user_reaction), so the head of the curve is capped at `users`
+    weights = [1 / (rank + 1) ** exponent for rank in range(posts)]
+    scale = total / sum(weights) if weights else 0
+    counts = []
+    for weight in weights:
+        expected = weight * scale
+        counts.append(min(int(expected) + (rng.random() < expected % 1), users))
+    rng.shuffle(counts)
+    return array("I", counts)
+
+
+def user_rows(rng: random.Random, n: int, hashes: list[str]):
+    for i in range(n):
+        yield (f"{BENCH_PREFIX}{i:08d}", name(rng), name(rng), hashes[i % len(hashes)],
+               Role.USER, 0, 0, BASE_TIME)
+
+
+def post_rows(rng: random.Random, user_ids: array, published: array, counts: array, author_exponent: float):
+    # the bench user gets every 50th post, the rest follow the author skew
+    authors = Zipf(rng, len(user_ids), author_exponent)
+    for start in range(0, len(published), INSERT_CHUNK):
+        chunk = authors.sample(rng, min(INSERT_CHUNK, len(published) - start))
+        for i, author in enumerate(chunk, start):
+            created_at = BASE_TIME + timedelta(seconds=published[i])
+            yield (
+                user_ids[0] if i % 50 == 0 else user_ids[author],
+                sentence(rng, 16, 100),
+                sentence(rng, 100 + rng.randrange(400)),
+                Status.PUBLISHED,
+                # views go with reactions, roughly one reaction every 10 to 40 impressions
+                counts[i] * rng.randint(10, 40) + rng.randrange(50),
+                0,
+                created_at,
+                created_at,
+            )
+
+
+def reaction_rows(rng: random.Random, post_ids: array, published: array, counts: array, user_ids: array):
+    # distinct users per post, so (post_id, user_id) never repeats without tracking the pairs
+    types, cum_weights = list(REACTION_WEIGHTS), list(accumulate(REACTION_WEIGHTS.values()))
+    for post_id, published_at, count in zip(post_ids, published, counts):
+        users = rng.sample(range(len(user_ids)), count)
+        for user, type in zip(users, rng.choices(types, cum_weights=cum_weights, k=count)):
+            seconds = published_at + rng.randrange(REACTION_WINDOW)
+            yield post_id, user_ids[user], type, BASE_TIME + timedelta(seconds=seconds)
+
+
+def copy_value(value):
+    # enums are stored by name, timestamps as naive UTC (see UtcDateTime)
+    if isinstance(value, Enum):
+        return value.name
+    if isinstance(value, datetime):
+        return value.astimezone(timezone.utc).replace(tzinfo=None).isoformat(sep=" ")
+    return value
+
+
+def copy_rows(session: Session, table, columns: tuple, rows) -> int:
+    cursor = session.connection().connection.cursor()
+    query = f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    written = 0
+    while chunk := list(islice(rows, COPY_CHUNK)):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows([copy_value(value) for value in row] for row in chunk)
+        buffer.seek(0)
+        cursor.copy_expert(query, buffer)
+        written += len(chunk)
+    return written
+
+
+def insert_rows(session: Session, table, columns: tuple, rows) -> int:
+    written = 0
+    while chunk := list(islice(rows, INSERT_CHUNK)):
+        session.execute(insert(table).values([dict(zip(columns, row)) for row in chunk]))
+        written += len(chunk)
+    return written
+
+
+def load(session: Session, table, columns: tuple, rows) -> int:
+    if session.get_bind().dialect.name == "postgresql":
+        return copy_rows(session, table, columns, rows)
+    return insert_rows(session, table, columns, rows)
+
+
+def bench_ids(session: Session, query) -> array:
+    # ids straight into an array, a list of ints is several times bigger at this scale
+    return array("q", session.execute(query.execution_options(yield_per=COPY_CHUNK)).scalars())
+
+
+def reset(session: Session):
+    bench_users = select(User.id).where(User.username.startswith(BENCH_PREFIX))
+    bench_posts = select(Post.id).where(Post.user_id.in_(bench_users))
+    # reactions.post_id doesn't cascade, the rest goes with the users
+    session.execute(delete(Reaction).where(Reaction.post_id.in_(bench_posts)))
+    session.execute(delete(User).where(User.username.startswith(BENCH_PREFIX)))
+    session.commit()
+
+
+def seed(users: int, posts: int, reactions: int, seed: int = 42, days: int = 30,
+         author_exponent: float = 0.8, popularity_exponent: float = 1.1, pool: int = 16) -> dict:
+    rng = random.Random(seed)
+    hashes = password_pool(pool)
+    published = array("I", (rng.randrange(days * 24 * 3600) for _ in range(posts)))
+    counts = reaction_counts(rng, posts, users, reactions, popularity_exponent)
+    bench_users = select(User.id).where(User.username.startswith(BENCH_PREFIX))
+    report = {}
+
+    with Session(engine) as session:
+        started = time.perf_counter()
+        report["users"] = load(session, User.__table__, USER_COLUMNS, user_rows(rng, users, hashes))
+        # usernames are numbered, in username order user_ids[i] is the i-th user
+        user_ids = bench_ids(session, bench_users.order_by(User.username))
+
+        rows = post_rows(rng, user_ids, published, counts, author_exponent)
+        report["posts"] = load(session, Post.__table__, POST_COLUMNS, rows)
+        # ids follow the load order, so post_ids[i] got counts[i]
+        post_ids = bench_ids(session, select(Post.id).where(Post.user_id.in_(bench_users)).order_by(Post.id))
+
+        rows = reaction_rows(rng, post_ids, published, counts, user_ids)
+        report["reactions"] = load(session, Reaction.__table__, REACTION_COLUMNS, rows)
+        session.commit()
+        rebuild_reaction_counts(session)
+
+        if session.get_bind().dialect.name == "postgresql":
+            # fresh statistics, or the first benchmark queries get planned for empty tables
+            session.execute(text("ANALYZE users, posts, reactions, post_reaction_counts"))
+            session.commit()
+        report["seconds"] = round(time.perf_counter() - started, 1)
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--posts", type=int, default=5000)
+    parser.add_argument("--reactions", type=int, default=50000, help="about this many, see reaction_counts")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--days", type=int, default=30, help="posts are published over this many days")
+    parser.add_argument("--author-exponent", type=float, default=0.8)
+    parser.add_argument("--popularity-exponent", type=float, default=1.1)
+    parser.add_argument("--password-pool", type=int, default=16, help="distinct bcrypt hashes")
+    parser.add_argument("--reset", action="store_true", help="remove the previous bench data first")
+    args = parser.parse_args()
+
+    init_db()
+    if args.reset:
+        with Session(engine) as session:
+            reset(session)
+    print(seed(args.users, args.posts, args.reactions, args.seed, args.days,
+               args.author_exponent, args.popularity_exponent, args.password_pool))
+
+
+if __name__ == "__main__":
+    main()
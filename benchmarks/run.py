@@ -0,0 +1,211 @@
+"""
+HTTP benchmarks of the hot routes. The app runs in-process through httpx's ASGI transport,
+lifespan included (scheduler, impression buffer, leaderboard), against the configured
+database, which needs the bench data from benchmarks.dataset:
+
+    python -m benchmarks.dataset --reset
+    python -m benchmarks.run --requests 500 --concurrency 20
+    python -m benchmarks.run --compare benchmarks/results/20260101-120000.json
+
+Each scenario reports p50/p95/p99 latency, throughput and errors (non-2xx responses).
+Every run is saved as JSON in benchmarks/results/, with the git commit and the arguments,
+and --compare prints the change against an earlier run.
+"""
+import argparse
+import asyncio
+import json
+import math
+import platform
+import random
+import subprocess
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+import httpx
+from sqlmodel import Session, select
+from app.main import app
+from app.db.session import engine
+from app.models.models import User, Post
+from app.models.enums import ReactionType
+from .dataset import BENCH_USERNAME, BENCH_PASSWORD, BENCH_PREFIX
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def percentile(values: list[float], p: float) -> float:
+    # nearest rank, values sorted
+    return values[max(math.ceil(p / 100 * len(values)) - 1, 0)]
+
+
+def summarize(latencies: list[float], errors: int, elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    ms = lambda seconds: round(seconds * 1000, 2)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "mean_ms": ms(sum(latencies) / len(latencies)),
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1]),
+    }
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def timed(self, name: str, request) -> httpx.Response:
+        start = time.perf_counter()
+        response = await request
+        self.latencies[name].append(time.perf_counter() - start)
+        if response.status_code >= 300:
+            self.errors[name] += 1
+        return response
+
+
+class Scenarios:
+    """Each scenario is one operation; the i-th call of a run gets i, so calls don't collide."""
+
+    def __init__(self, client: httpx.AsyncClient, rng: random.Random, token: str,
+                 post_ids: list[int], own_post_ids: list[int]):
+        self.client = client
+        self.rng = rng
+        self.auth = {"Authorization": f"Bearer {token}"}
+        self.post_ids = post_ids
+        self.own_post_ids = own_post_ids
+        # reactions go to distinct posts, concurrent create/delete pairs don't step on each other
+        self.reaction_posts = rng.sample(post_ids, len(post_ids))
+
+    async def post_detail(self, recorder: Recorder, i: int):
+        await recorder.timed("post_detail", self.client.get(f"/posts/{self.rng.choice(self.post_ids)}"))
+
+    async def list_posts(self, recorder: Recorder, i: int):
+        await recorder.timed("list_posts", self.client.get("/posts/", params={"limit": 20}))
+
+    async def reactions(self, recorder: Recorder, i: int):
+        post_id = self.reaction_posts[i % len(self.reaction_posts)]
+        reaction = self.rng.choice(list(ReactionType)).value
+        await recorder.timed("create_reaction", self.client.post(
+            f"/posts/{post_id}/reactions", params={"reaction": reaction}, headers=self.auth))
+        await recorder.timed("delete_reaction", self.client.delete(f"/posts/{post_id}/reactions", headers=self.auth))
+
+    async def metrics(self, recorder: Recorder, i: int):
+        post_id = self.rng.choice(self.own_post_ids)
+        await recorder.timed("metrics", self.client.get(f"/analytics/{post_id}/metrics", headers=self.auth))
+
+    async def top_posts(self, recorder: Recorder, i: int):
+        await recorder.timed("top_posts", self.client.get("/analytics/posts/top", params={"limit": 10}))
+
+    async def login(self, recorder: Recorder, i: int):
+        await recorder.timed("login", self.client.post(
+            "/auth/login", data={"username": BENCH_USERNAME, "password": BENCH_PASSWORD}))
+
+
+async def run_scenario(scenario, total: int, concurrency: int) -> Recorder:
+    recorder = Recorder()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            await scenario(recorder, i)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    recorder.elapsed = time.perf_counter() - started
+    return recorder
+
+
+def bench_posts() -> tuple[list[int], list[int]]:
+    with Session(engine) as session:
+        bench_user = session.exec(select(User).where(User.username == BENCH_USERNAME)).one_or_none()
+        if bench_user is None:
+            raise SystemExit("no bench data, run `python -m benchmarks.dataset` first")
+        bench_users = select(User.id).where(User.username.startswith(BENCH_PREFIX))
+        post_ids = session.exec(select(Post.id).where(Post.user_id.in_(bench_users)).order_by(Post.id)).all()
+        own_post_ids = session.exec(select(Post.id).where(Post.user_id == bench_user.id).order_by(Post.id)).all()
+    return list(post_ids), list(own_post_ids)
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, previous_path: Path):
+    previous = json.loads(previous_path.read_text())["scenarios"]
+    print(f"\nchange against {previous_path.name} (negative latency / positive throughput is better)")
+    for name, current in results.items():
+        if name not in previous:
+            continue
+        changes = []
+        for key in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps"):
+            before = previous[name][key]
+            change = (current[key] - before) / before * 100 if before else 0.0
+            changes.append(f"{key} {change:+.1f}%")
+        print(f"  {name:<16} " + "  ".join(changes))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500, help="operations per scenario")
+    parser.add_argument("--login-requests", type=int, default=50, help="logins are bcrypt bound, fewer of them")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=20, help="unrecorded operations per scenario")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--scenarios", nargs="*",
+                        default=["post_detail", "list_posts", "reactions", "metrics", "top_posts", "login"])
+    parser.add_argument("--output", type=Path, default=None, help="defaults to benchmarks/results/<time>.json")
+    parser.add_argument("--compare", type=Path, default=None, help="an earlier results file")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    post_ids, own_post_ids = bench_posts()
+    results = {}
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            login = await client.post("/auth/login", data={"username": BENCH_USERNAME, "password": BENCH_PASSWORD})
+            login.raise_for_status()
+            scenarios = Scenarios(client, rng, login.json()["access_token"], post_ids, own_post_ids)
+
+            for name in args.scenarios:
+                scenario = getattr(scenarios, name)
+                total = args.login_requests if name == "login" else args.requests
+                await run_scenario(scenario, min(args.warmup, total), args.concurrency)
+                recorder = await run_scenario(scenario, total, args.concurrency)
+                for recorded, latencies in recorder.latencies.items():
+                    results[recorded] = summarize(latencies, recorder.errors[recorded], recorder.elapsed)
+
+    print(f"{'route':<16} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for name, result in results.items():
+        print(f"{name:<16} {result['throughput_rps']:>8} {result['p50_ms']:>9} {result['p95_ms']:>9} "
+              f"{result['p99_ms']:>9} {result['errors']:>7}")
+
+    finished = datetime.now(timezone.utc)
+    output = args.output or RESULTS_DIR / f"{finished:%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        "meta": {
+            "finished_at": finished.isoformat(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "args": {key: str(value) for key, value in vars(args).items()},
+        },
+        "scenarios": results,
+    }, indent=2))
+    print(f"saved to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
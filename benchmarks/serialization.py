@@ -0,0 +1,110 @@
+"""
+Time to turn a page of posts into a JSON body, the way the list routes used to do it
+and the way they do it now:
+
+    orm        ORM objects -> response_model validation -> jsonable_encoder -> json.dumps
+    adapter    ORM objects -> precompiled TypeAdapter, validated and dumped in pydantic-core
+    rows       column tuples -> dicts -> orjson (what GET /posts/ does now)
+
+By default the objects and rows are built in memory, so only serialization is measured.
+With --from-db they are loaded from the configured database, select(Post) vs the public
+columns, which adds the ORM loading/identity map cost on top.
+
+    python -m benchmarks.serialization --rows 10000 --repeat 20
+    python -m benchmarks.serialization --rows 10000 --from-db
+"""
+import argparse
+import json
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from sqlmodel import Session, select
+from app.db.session import engine
+from app.models.models import Post
+from app.models.enums import Status
+from app.schemas.post import PostPage, PostPublic
+from app.core.serialization import OrjsonResponse, public_columns, as_dicts
+
+POST_COLUMNS = public_columns(Post, PostPublic)
+page_adapter = TypeAdapter(PostPage)
+
+
+def fake_rows(n: int) -> list[tuple]:
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    return [
+        (i, i % 500 + 1, f"Post number {i}", "Lorem ipsum dolor sit amet. " * 10, Status.PUBLISHED,
+         i * 7, start + timedelta(minutes=i), None)
+        for i in range(1, n + 1)
+    ]
+
+
+def load(n: int, from_db: bool):
+    if not from_db:
+        rows = fake_rows(n)
+        keys = [column.key for column in POST_COLUMNS]
+        objects = [Post(**dict(zip(keys, row))) for row in rows]
+        return (lambda: objects), (lambda: [dict(zip(keys, row)) for row in rows])
+
+    def orm_objects():
+        with Session(engine) as session:
+            return session.exec(select(Post).limit(n)).all()
+
+    def row_dicts():
+        with Session(engine) as session:
+            return as_dicts(session.exec(select(*POST_COLUMNS).limit(n)).all())
+
+    return orm_objects, row_dicts
+
+
+def orm(objects) -> bytes:
+    # what FastAPI does with a response_model: validate, then jsonable_encoder, then json.dumps
+    page = page_adapter.validate_python({"items": objects(), "next_cursor": None}, from_attributes=True)
+    content = jsonable_encoder(page_adapter.dump_python(page, mode="json"))
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def adapter(objects) -> bytes:
+    page = page_adapter.validate_python({"items": objects(), "next_cursor": None}, from_attributes=True)
+    return page_adapter.dump_json(page)
+
+
+def rows(row_dicts) -> bytes:
+    return OrjsonResponse({"items": row_dicts(), "next_cursor": None}).body
+
+
+def measure(fn, source, repeat: int) -> dict:
+    fn(source)  # warm up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = fn(source)
+        timings.append((time.perf_counter() - start) * 1000)
+    return {"median_ms": round(statistics.median(timings), 2), "min_ms": round(min(timings), 2), "bytes": len(body)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--from-db", action="store_true", help="load the posts from the database")
+    args = parser.parse_args()
+
+    objects, row_dicts = load(args.rows, args.from_db)
+    results = {
+        "orm": measure(orm, objects, args.repeat),
+        "adapter": measure(adapter, objects, args.repeat),
+        "rows": measure(rows, row_dicts, args.repeat),
+    }
+
+    baseline = results["orm"]["median_ms"]
+    print(f"{args.rows} posts, median of {args.repeat} runs{' (from the database)' if args.from_db else ''}")
+    for name, result in results.items():
+        speedup = baseline / result["median_ms"] if result["median_ms"] else float("inf")
+        print(f"  {name:<8} {result['median_ms']:>9.2f} ms  (min {result['min_ms']:.2f}, "
+              f"{result['bytes']} bytes, x{speedup:.1f})")
+
+
+if __name__ == "__main__":
+    main()
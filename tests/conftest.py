@@ -0,0 +1,90 @@
+"""
+The tests run against a real PostgreSQL: the database in TEST_DB_NAME (linkedindb_test
+by default) on the usual DB_HOST/DB_PORT with the usual credentials. It has to exist,
+the tables are created by the app and emptied before every test.
+"""
+import itertools
+import os
+from dataclasses import dataclass
+
+# before anything imports the settings
+os.environ["DB_NAME"] = os.environ.get("TEST_DB_NAME", "linkedindb_test")
+os.environ["REPLICA_URLS"] = ""
+os.environ["QUERY_BUDGET_MODE"] = "raise"
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+# the background jobs stay out of the way, tests flush and refresh when they need to
+os.environ.setdefault("IMPRESSION_FLUSH_INTERVAL_SECONDS", "3600")
+os.environ.setdefault("LEADERBOARD_REFRESH_SECONDS", "3600")
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlmodel import SQLModel, Session
+from app.main import app
+from app.db.session import engine
+from app.api.deps import decode_jwt
+from app.core.config import settings
+from app.core.impressions import impression_buffer
+from app.core.leaderboard import leaderboard
+
+pytest_plugins = ["app.db.pytest_plugin"]
+
+PASSWORD = "test-password-123"
+_usernames = itertools.count()
+
+
+@dataclass
+class Account:
+    id: int
+    username: str
+    headers: dict
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture(autouse=True)
+def clean_db(client):
+    # ids keep growing across tests (no RESTART IDENTITY), so what the app keeps in
+    # memory per user or per post can't leak into the next test
+    impression_buffer.flush()
+    tables = ", ".join(table.name for table in SQLModel.metadata.sorted_tables)
+    with engine.begin() as connection:
+        connection.execute(text(f"TRUNCATE {tables} CASCADE"))
+    leaderboard.refresh()
+    yield
+
+
+@pytest.fixture
+def session():
+    with Session(engine) as session:
+        yield session
+
+
+@pytest.fixture
+def make_user(client):
+    def make(role: str = "user") -> Account:
+        username = f"testuser{next(_usernames):04d}"
+        response = client.post("/auth/register", json={
+            "firstname": "Test", "lastname": "User", "username": username, "password": PASSWORD, "role": role,
+        })
+        assert response.status_code == 201, response.text
+        response = client.post("/auth/login", data={"username": username, "password": PASSWORD})
+        assert response.status_code == 200, response.text
+        token = response.json()["access_token"]
+        claims = decode_jwt(token, settings.SECRET_KEY, [settings.ALGORITHM])
+        return Account(id=claims["uid"], username=username, headers={"Authorization": f"Bearer {token}"})
+    return make
+
+
+@pytest.fixture
+def make_post(client):
+    def make(user: Account, title: str = "A test post", **fields) -> dict:
+        response = client.post("/posts/", json={"title": title, "body": "Some text.", **fields},
+                               headers=user.headers)
+        assert response.status_code == 201, response.text
+        return response.json()
+    return make
@@ -0,0 +1,14 @@
+"""
+A scheduler worker and nothing else, started by test_leader.py in processes of their own.
+It competes for the leadership and logs on stdout when it wins and what it publishes.
+"""
+import logging
+import sys
+import time
+from app.core.schedule_queue import scheduler_leader
+
+if __name__ == "__main__":
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO, format="%(name)s %(message)s")
+    scheduler_leader.start()
+    while True:
+        time.sleep(1)
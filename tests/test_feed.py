@@ -0,0 +1,64 @@
+import pytest
+from sqlalchemy import func
+from sqlmodel import select
+from app.core.config import settings
+from app.core.feed import trim_feeds
+from app.models.models import FeedEntry
+
+
+@pytest.fixture(autouse=True)
+def small_threshold(monkeypatch):
+    # authors with 2 followers or more are read at feed time
+    monkeypatch.setattr(settings, "FEED_FANOUT_MAX_FOLLOWERS", 2)
+
+
+def feed(client, user) -> list[int]:
+    return [post["id"] for post in client.get("/feed/", headers=user.headers).json()["items"]]
+
+
+def follow(client, follower, author):
+    assert client.post(f"/users/{author.id}/follow", headers=follower.headers).status_code == 201
+
+
+def test_author_going_over_the_threshold(client, make_user, make_post):
+    author, reader, other = make_user(), make_user(), make_user()
+    follow(client, reader, author)
+    fanned_out = make_post(author)["id"]
+
+    follow(client, other, author)
+    pulled = make_post(author)["id"]
+
+    assert feed(client, reader) == [pulled, fanned_out]
+    # a new follower gets the fanned out posts in their timeline and reads the others
+    assert feed(client, other) == [pulled, fanned_out]
+
+
+def test_author_going_under_the_threshold(client, make_user, make_post):
+    author, reader, other = make_user(), make_user(), make_user()
+    follow(client, reader, author)
+    follow(client, other, author)
+    pulled = make_post(author)["id"]
+
+    assert client.delete(f"/users/{author.id}/follow", headers=other.headers).status_code == 204
+    fanned_out = make_post(author)["id"]
+
+    # the post from before the unfollow is read where it is
+    assert feed(client, reader) == [fanned_out, pulled]
+    assert feed(client, other) == []
+
+
+def test_trim_only_touches_long_timelines(client, session, make_user, make_post, monkeypatch):
+    author, reader, late = make_user(), make_user(), make_user()
+    follow(client, reader, author)
+    posts = [make_post(author)["id"] for _ in range(5)]
+    follow(client, late, author)
+
+    monkeypatch.setattr(settings, "FEED_MAX_ENTRIES", 3)
+    timelines = lambda: dict(session.exec(select(FeedEntry.user_id, func.count()).group_by(FeedEntry.user_id)).all())
+    # the late follower was backfilled with all 5, like the reader
+    assert timelines() == {reader.id: 5, late.id: 5}
+
+    assert trim_feeds() == 4
+    assert timelines() == {reader.id: 3, late.id: 3}
+    assert feed(client, reader) == posts[:1:-1]
+    assert trim_feeds() == 0
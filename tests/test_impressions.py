@@ -0,0 +1,40 @@
+"""
+The impressions of a post as the buffer reports them, from a request that read
+posts.impressions before or after a flush committed.
+"""
+from sqlmodel import Session
+from app.core import impressions
+from app.core.impressions import ImpressionBuffer
+from app.db.session import engine
+from app.models.models import Post
+
+
+def stored(post_id: int) -> int:
+    with Session(engine) as session:
+        return session.get(Post, post_id).impressions
+
+
+def test_flush_neither_loses_nor_double_counts(make_user, make_post, monkeypatch):
+    post_id = make_post(make_user())["id"]
+    buffer = ImpressionBuffer(threshold=1000)
+    for _ in range(3):
+        buffer.record(post_id, 0)
+
+    seen = []
+
+    class CommitWatch(Session):
+        def commit(self):
+            # a request reading the post while the flush commits, from either side of it
+            seen.append(("before", buffer.impressions(post_id, stored(post_id))))
+            super().commit()
+            seen.append(("after", buffer.impressions(post_id, stored(post_id))))
+            seen.append(("stale", buffer.impressions(post_id, 0)))
+
+    monkeypatch.setattr(impressions, "Session", CommitWatch)
+    assert buffer.flush() == 3
+    assert seen == [("before", 3), ("after", 3), ("stale", 3)]
+
+    # once the flush is done too, and a view on top of a read from before it
+    assert stored(post_id) == 3
+    assert buffer.impressions(post_id, 3) == 3
+    assert buffer.record(post_id, 0) == 4
@@ -0,0 +1,97 @@
+import os
+import re
+import signal
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+import pytest
+from sqlmodel import select
+from app.core.schedule_queue import scheduler_leader
+from app.models.enums import Status
+from app.models.models import Post
+
+WORKER = Path(__file__).with_name("scheduler_worker.py")
+ELECTED = "this process is now the scheduler leader"
+PUBLISHED = re.compile(r"publishing post (\d+)")
+
+
+class Worker:
+    def __init__(self):
+        env = os.environ | {"SCHEDULER_HEARTBEAT_SECONDS": "0.2",
+                            "PYTHONPATH": str(WORKER.parent.parent)}
+        self.process = subprocess.Popen([sys.executable, "-u", str(WORKER)], env=env, text=True,
+                                        stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        self.lines = []
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        for line in self.process.stdout:
+            self.lines.append(line.strip())
+
+    @property
+    def elected(self) -> int:
+        return sum(ELECTED in line for line in self.lines)
+
+    @property
+    def published(self) -> list[int]:
+        return [int(match[1]) for line in self.lines if (match := PUBLISHED.search(line))]
+
+
+def wait_for(condition, timeout: float = 15):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+@pytest.fixture
+def workers():
+    # the app of the test process leaves the lock to the workers
+    scheduler_leader.stop()
+    started = []
+    yield lambda n: started.extend(Worker() for _ in range(n)) or started
+    for worker in started:
+        worker.process.kill()
+        worker.process.wait()
+    scheduler_leader.start()
+
+
+def schedule_posts(client, user, n: int) -> list[int]:
+    at = (datetime.now(timezone.utc) + timedelta(seconds=1)).isoformat()
+    ids = []
+    for i in range(n):
+        response = client.post("/posts/", json={"title": f"scheduled {i}", "body": "Later.", "scheduled_at": at},
+                               headers=user.headers)
+        assert response.json()["status"] == "scheduled"
+        ids.append(response.json()["id"])
+    return ids
+
+
+def test_one_leader_fails_over_without_publishing_twice(client, session, make_user, workers):
+    user = make_user()
+    pool = workers(3)
+    # importing the app takes a while in a cold process
+    wait_for(lambda: sum(worker.elected for worker in pool) == 1, timeout=60)
+    # a few heartbeats later the others are still standing by
+    time.sleep(1)
+    leaders = [worker for worker in pool if worker.elected]
+    assert len(leaders) == 1
+
+    first = schedule_posts(client, user, 10)
+    wait_for(lambda: sorted(leaders[0].published) == first)
+
+    # SIGKILL: no clean shutdown, Postgres releases the lock when the connection drops
+    leaders[0].process.send_signal(signal.SIGKILL)
+    second = schedule_posts(client, user, 10)
+    wait_for(lambda: sum(worker.elected for worker in pool) == 2)
+    wait_for(lambda: len([id for worker in pool for id in worker.published]) >= 20)
+    time.sleep(0.5)
+
+    published = [id for worker in pool for id in worker.published]
+    assert sorted(published) == first + second
+    assert [worker.elected for worker in pool].count(1) == 2
+    statuses = session.exec(select(Post.status).where(Post.id.in_(first + second))).all()
+    assert set(statuses) == {Status.PUBLISHED}
@@ -0,0 +1,43 @@
+from sqlalchemy import update
+from app.core.leaderboard import Leaderboard
+from app.models.models import User, Post
+
+
+def make_posts(session, impressions: list[int]) -> list[int]:
+    user = User(username="leaderboard", firstname="Lead", lastname="Board", password="not-a-real-hash")
+    posts = [Post(title=f"post {i}", body="Text.", impressions=n, user=user) for i, n in enumerate(impressions)]
+    session.add_all(posts)
+    session.commit()
+    return [post.id for post in posts]
+
+
+def set_impressions(session, impressions: dict[int, int]):
+    for id, n in impressions.items():
+        session.exec(update(Post).where(Post.id == id).values(impressions=n))
+    session.commit()
+
+
+def ranking(board: Leaderboard) -> list[tuple[int, int]]:
+    return [(entry["id"], entry["impressions"]) for entry in board.top(board.capacity)]
+
+
+def test_refresh_keeps_ties(session):
+    a, b, c = make_posts(session, [0, 0, 0])
+    board = Leaderboard(size=1)
+
+    board.refresh()
+    assert ranking(board) == [(a, 0), (b, 0)]
+    board.refresh()
+    assert ranking(board) == [(a, 0), (b, 0)]
+
+
+def test_refresh_follows_lower_values(session):
+    a, b, c = make_posts(session, [10, 20, 30])
+    board = Leaderboard(size=1)
+
+    board.refresh()
+    assert ranking(board) == [(c, 30), (b, 20)]
+
+    set_impressions(session, {a: 3, b: 1, c: 2})
+    board.refresh()
+    assert ranking(board) == [(a, 3), (c, 2)]
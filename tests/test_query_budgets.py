@@ -0,0 +1,93 @@
+"""
+The routes with a query budget, run in raise mode: a route going over its budget or
+repeating a statement fails with QueryBudgetExceeded, which TestClient re-raises here.
+"""
+import pytest
+from app.core.config import settings
+from app.core.impressions import impression_buffer
+from app.db.queries import QueryBudgetExceeded, QueryTracker
+
+
+@pytest.fixture(autouse=True)
+def raise_mode(monkeypatch):
+    monkeypatch.setattr(settings, "QUERY_BUDGET_MODE", "raise")
+
+
+@pytest.fixture
+def posts(client, make_user, make_post):
+    author, reader = make_user(), make_user()
+    client.post(f"/users/{author.id}/follow", headers=reader.headers)
+    ids = [make_post(author, title=f"budget post {i}")["id"] for i in range(25)]
+    return author, reader, ids
+
+
+def test_post_lists(client, posts):
+    author, reader, ids = posts
+    page = client.get("/posts/", params={"limit": 10}).json()
+    assert len(page["items"]) == 10
+    page = client.get("/posts/", params={"limit": 10, "cursor": page["next_cursor"]}).json()
+    assert len(page["items"]) == 10
+
+    assert len(client.get("/posts/my-posts", headers=author.headers).json()["items"]) == 20
+    assert client.get("/posts/search", params={"q": "budget"}).status_code == 200
+    assert len(client.get("/feed/", headers=reader.headers).json()["items"]) == 20
+
+
+def test_post_detail(client, posts, monkeypatch):
+    author, reader, ids = posts
+    assert client.get(f"/posts/{ids[0]}").status_code == 200
+
+    # the view that fills the buffer flushes it, outside the request's budget of 1
+    impression_buffer.flush()
+    monkeypatch.setattr(impression_buffer, "threshold", 3)
+    for _ in range(3):
+        response = client.get(f"/posts/{ids[1]}", headers=reader.headers)
+        assert response.status_code == 200
+    assert response.json()["impressions"] == 3
+    assert impression_buffer.pending(ids[1]) == 0
+
+
+def test_reactions(client, posts):
+    author, reader, ids = posts
+    for reaction in ("like", "celebrate"):
+        response = client.post(f"/posts/{ids[0]}/reactions", params={"reaction": reaction}, headers=reader.headers)
+        assert response.status_code == 201
+    assert client.post(f"/posts/{ids[-1] + 1000}/reactions", params={"reaction": "like"},
+                       headers=reader.headers).status_code == 404
+    assert client.delete(f"/posts/{ids[0]}/reactions", headers=reader.headers).status_code == 204
+
+
+def test_bulk_reactions_have_no_repeat_limit(client, posts, make_user, monkeypatch):
+    author, reader, ids = posts
+    admin = make_user(role="admin")
+    # one insert per chunk, more chunks than QUERY_REPEAT_THRESHOLD
+    monkeypatch.setattr(settings, "BULK_REACTION_CHUNK_SIZE", 2)
+    items = [{"post_id": id, "user_id": user.id, "type": "like"} for id in ids for user in (author, reader)]
+    response = client.post("/posts/reactions/bulk", json=items, headers=admin.headers)
+    assert response.status_code == 200
+
+
+def test_analytics_and_comments(client, posts):
+    author, reader, ids = posts
+    client.get(f"/posts/{ids[0]}", headers=reader.headers)
+    client.post(f"/posts/{ids[0]}/reactions", params={"reaction": "insightful"}, headers=reader.headers)
+    client.post(f"/posts/{ids[0]}/comments", json={"body": "Nice."}, headers=reader.headers)
+
+    analytics = client.get(f"/analytics/{ids[0]}/metrics", headers=author.headers).json()["analytics"]
+    assert analytics["total_reactions"] == 1
+    assert analytics["impressions"] == 1
+    assert client.get("/analytics/posts/top").status_code == 200
+    assert len(client.get(f"/posts/{ids[0]}/comments").json()["items"]) == 1
+
+
+def test_tracker_raises_over_budget():
+    tracker = QueryTracker(max_queries=1, max_repeats=2)
+    tracker.record("SELECT 1", 0.001)
+    with pytest.raises(QueryBudgetExceeded, match="budget is 1"):
+        tracker.record("SELECT 2", 0.001)
+
+    tracker = QueryTracker(max_repeats=2)
+    tracker.record("SELECT 1", 0.001)
+    tracker.record("SELECT 1", 0.001)
+    with pytest.raises(QueryBudgetExceeded, match="N\\+1"):
+        tracker.record("SELECT 1", 0.001)
@@ -0,0 +1,63 @@
+import threading
+import time
+import pytest
+from sqlalchemy import delete, func
+from sqlmodel import Session, select
+from app.core.counters import upsert_reaction, reaction_count_delta
+from app.core.leaderboard import leaderboard
+from app.db.session import engine
+from app.models.enums import ReactionType
+from app.models.models import Reaction, PostReactionCount
+
+
+def counts(session, post_id: int) -> tuple[dict, dict]:
+    rows = session.exec(select(Reaction.type, func.count()).where(Reaction.post_id == post_id)
+                        .group_by(Reaction.type)).all()
+    counted = session.exec(select(PostReactionCount.type, PostReactionCount.count)
+                           .where(PostReactionCount.post_id == post_id, PostReactionCount.count != 0)).all()
+    return dict(rows), dict(counted)
+
+
+def first(other: Session, post_id: int, user_id: int):
+    # what the route does for another request of the same user, minus the commit
+    reaction = other.execute(upsert_reaction(post_id, user_id, ReactionType.LIKE)).one()
+    return lambda: reaction.inserted and leaderboard.add_reactions(post_id, 1)
+
+
+def change(other: Session, post_id: int, user_id: int):
+    other.execute(upsert_reaction(post_id, user_id, ReactionType.LOVE)).one()
+    return lambda: None
+
+
+def remove(other: Session, post_id: int, user_id: int):
+    other.execute(delete(Reaction).where(Reaction.post_id == post_id, Reaction.user_id == user_id))
+    other.execute(reaction_count_delta(post_id, ReactionType.LIKE, -1))
+    return lambda: leaderboard.add_reactions(post_id, -1)
+
+
+@pytest.mark.parametrize("concurrent, existing", [(first, None), (change, "like"), (remove, "like")])
+def test_concurrent_reactions_keep_the_counts(client, session, make_user, make_post, concurrent, existing):
+    author, user = make_user(), make_user()
+    post = make_post(author)
+    if existing:
+        client.post(f"/posts/{post['id']}/reactions", params={"reaction": existing}, headers=user.headers)
+    leaderboard.refresh()
+
+    with Session(engine) as other:
+        # the other request gets in first and holds its transaction open
+        after_commit = concurrent(other, post["id"], user.id)
+        responses = []
+        request = threading.Thread(target=lambda: responses.append(client.post(
+            f"/posts/{post['id']}/reactions", params={"reaction": "celebrate"}, headers=user.headers)))
+        request.start()
+        time.sleep(0.5)
+        assert request.is_alive(), "the request should be waiting on the other transaction"
+        other.commit()
+        after_commit()
+    request.join()
+
+    assert responses[0].status_code == 201
+    assert responses[0].json()["type"] == "celebrate"
+    rows, counted = counts(session, post["id"])
+    assert rows == counted == {ReactionType.CELEBRATE: 1}
+    assert leaderboard.top(1)[0]["total_reactions"] == 1
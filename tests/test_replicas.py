@@ -0,0 +1,122 @@
+"""
+Read routing against two local databases: the test database is the primary and
+TEST_REPLICA_DB_NAME (linkedindb_test_replica by default) a stand-in replica, never synced,
+so where a read went shows in what it finds. Like the test database, it has to exist.
+"""
+import os
+import time
+import pytest
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+from sqlmodel import SQLModel, create_engine
+from app.api import auth
+from app.core.config import settings
+from app.db.replicas import ReplicaSet
+
+PRIMARY = settings.DB_NAME
+REPLICA = os.environ.get("TEST_REPLICA_DB_NAME", "linkedindb_test_replica")
+
+
+def engines(database: str, port: int = settings.DB_PORT):
+    url = make_url(settings.DATABASE_URL).set(database=database, port=port)
+    return (create_engine(url, poolclass=NullPool, connect_args={"connect_timeout": 1}),
+            create_async_engine(url.set(drivername="postgresql+asyncpg"), poolclass=NullPool,
+                                connect_args={"timeout": 1}))
+
+
+@pytest.fixture(scope="module")
+def replica():
+    sync, async_ = engines(REPLICA)
+    SQLModel.metadata.create_all(sync)
+    yield sync, async_
+    sync.dispose()
+
+
+@pytest.fixture
+def down():
+    # nothing listens on port 1, connecting fails right away
+    return engines(PRIMARY, port=1)
+
+
+def make_replicas(*pairs, pin_seconds: float = 5, retry_seconds: float = 30) -> ReplicaSet:
+    return ReplicaSet([sync for sync, _ in pairs], [async_ for _, async_ in pairs], pin_seconds, retry_seconds)
+
+
+def database(replicas: ReplicaSet, user_id: int | None = None) -> str:
+    with replicas.read_session(user_id) as session:
+        return session.exec(text("SELECT current_database()")).one()[0]
+
+
+def async_database(client, replicas: ReplicaSet, user_id: int | None = None) -> str:
+    # on the app's event loop, the primary's async pool belongs to it
+    async def read():
+        async with replicas.async_read_session(user_id) as session:
+            return (await session.exec(text("SELECT current_database()"))).one()[0]
+    return client.portal.call(read)
+
+
+def test_reads_go_round_robin(client, replica):
+    other = engines(PRIMARY)
+    replicas = make_replicas(replica, other)
+    assert sorted(database(replicas) for _ in range(4)) == [PRIMARY, PRIMARY, REPLICA, REPLICA]
+    assert sorted(async_database(client, replicas) for _ in range(2)) == [PRIMARY, REPLICA]
+
+
+def test_no_replicas_reads_the_primary(client):
+    replicas = make_replicas()
+    replicas.pin(1)
+    assert database(replicas) == PRIMARY
+    assert async_database(client, replicas) == PRIMARY
+
+
+def test_pinned_user_reads_the_primary(client, replica):
+    replicas = make_replicas(replica, pin_seconds=0.5)
+    replicas.pin(1)
+    assert database(replicas, 1) == PRIMARY
+    assert async_database(client, replicas, 1) == PRIMARY
+    # the others still read the replica
+    assert database(replicas, 2) == REPLICA
+    assert database(replicas) == REPLICA
+
+    time.sleep(0.6)
+    assert database(replicas, 1) == REPLICA
+
+
+def test_replica_down_fails_over(client, replica, down):
+    replicas = make_replicas(down, replica, retry_seconds=0.5)
+    assert [database(replicas) for _ in range(3)] == [REPLICA] * 3
+    assert replicas.candidates(None) == [1]
+
+    # retried once the retry delay is over, two reads and one of them starts with it
+    time.sleep(0.6)
+    assert 0 in replicas.candidates(None)
+    assert [async_database(client, replicas) for _ in range(2)] == [REPLICA] * 2
+    assert replicas.candidates(None) == [1]
+
+
+def test_all_replicas_down_reads_the_primary(client, down):
+    replicas = make_replicas(down)
+    assert database(replicas) == PRIMARY
+    assert async_database(client, replicas) == PRIMARY
+
+
+def test_routes_read_your_writes(client, make_user, make_post, replica, monkeypatch):
+    monkeypatch.setattr(auth, "replicas", make_replicas(replica))
+    user, other = make_user(), make_user()
+
+    # the users only exist on the primary, so a read served by the replica doesn't find them
+    assert client.get(f"/users/{other.id}", headers=user.headers).status_code == 404
+
+    # after a write, the writer reads from the primary
+    assert client.put("/users/", json={"firstname": "Changed"}, headers=user.headers).status_code == 200
+    response = client.get(f"/users/{user.id}", headers=user.headers)
+    assert response.status_code == 200
+    assert response.json()["firstname"] == "Changed"
+    assert client.get(f"/users/{user.id}").status_code == 404
+
+    # post detail reads the primary for everyone, the impressions must not go backwards
+    post = make_post(other)
+    assert client.get("/posts/").json()["items"] == []
+    assert client.get(f"/posts/{post['id']}").status_code == 200
@@ -0,0 +1,33 @@
+from datetime import datetime, timedelta, timezone
+from app.core import scheduler
+from app.models.enums import Status
+from app.models.models import User, Post
+
+
+SAMPLES = ("scheduled_posts_claimed_total", "scheduled_posts_published_total",
+           "scheduled_post_publish_lag_seconds_count")
+
+
+def samples(client) -> list[float]:
+    values = dict(line.rsplit(" ", 1) for line in client.get("/metrics").text.splitlines()
+                  if not line.startswith("#"))
+    return [float(values.get(name, 0)) for name in SAMPLES]
+
+
+def test_publish_records_lag_and_counts(client, session):
+    # inserted directly, no notification: the app's own schedule queue doesn't know about them
+    user = User(username="scheduler", firstname="Sche", lastname="Duler", password="not-a-real-hash")
+    due = datetime.now(timezone.utc) - timedelta(seconds=3)
+    session.add_all([Post(title=f"due {i}", body="Now.", status=Status.SCHEDULED, scheduled_at=due, user=user)
+                     for i in range(3)])
+    session.commit()
+    before = samples(client)
+
+    report = scheduler.publish_scheduled_posts()
+
+    assert report.published == 3
+    assert report.max_lag_ms >= 3000
+    assert scheduler.last_publish_report is report
+    # claimed, published and lag observations
+    assert [after - earlier for after, earlier in zip(samples(client), before)] == [3, 3, 3]
+    assert "scheduler_last_publish_max_lag_seconds " in client.get("/metrics").text
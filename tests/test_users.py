@@ -0,0 +1,25 @@
+from sqlalchemy import func
+from sqlmodel import select
+from app.models.models import Reaction, PostReactionCount
+
+
+def reaction_totals(session, post_id: int) -> tuple[int, int]:
+    rows = session.exec(select(func.count()).where(Reaction.post_id == post_id)).one()
+    counted = session.exec(
+        select(func.coalesce(func.sum(PostReactionCount.count), 0)).where(PostReactionCount.post_id == post_id)
+    ).one()
+    return rows, counted
+
+
+def test_delete_user_removes_their_reactions_and_counts(client, session, make_user, make_post):
+    author, fan, other = make_user(), make_user(), make_user()
+    post = make_post(author)
+    client.post(f"/posts/{post['id']}/reactions", params={"reaction": "like"}, headers=fan.headers)
+    client.post(f"/posts/{post['id']}/reactions", params={"reaction": "celebrate"}, headers=other.headers)
+    assert reaction_totals(session, post["id"]) == (2, 2)
+
+    response = client.delete("/users/", headers=fan.headers)
+    assert response.status_code == 204
+
+    assert reaction_totals(session, post["id"]) == (1, 1)
+    assert session.exec(select(func.count()).where(Reaction.user_id.is_(None))).one() == 0